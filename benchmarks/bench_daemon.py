@@ -0,0 +1,47 @@
+import io
+import os
+
+from .common import run_benchmark, write_pywal_colors, NullWriter
+
+def run(iterations):
+    """Benchmarks Daemon.handle_message for each action, with stdout replaced by a null writer."""
+    from pywalfox.daemon import Daemon
+    from pywalfox.config import ACTIONS, PYWAL_COLORS_PATH, HOME_PATH
+
+    write_pywal_colors(PYWAL_COLORS_PATH)
+
+    daemon = Daemon(3)
+    daemon.chrome_path = os.path.join(HOME_PATH, 'chrome')
+    os.makedirs(daemon.chrome_path, exist_ok=True)
+    daemon.messenger.stdin = io.BytesIO()
+    daemon.messenger.stdout = NullWriter()
+    daemon.persisted_state_sent = True
+
+    messages = [
+        {'action': ACTIONS['VERSION']},
+        {'action': ACTIONS['COLORS']},
+        {'action': ACTIONS['CSS_ENABLE'], 'target': 'userChrome'},
+        {'action': ACTIONS['CSS_FONT_SIZE'], 'target': 'userChrome', 'size': 13},
+        {'action': ACTIONS['CSS_DISABLE'], 'target': 'userChrome'},
+        {'action': ACTIONS['INVALID_ACTION']},
+    ]
+
+    def handle_message(message):
+        # CSS actions run on the action thread pool, wait for their response
+        daemon.handle_message(message)
+        daemon.actions.wait()
+
+    results = []
+    for message in messages:
+        setup = None
+        if message['action'] == ACTIONS['CSS_FONT_SIZE']:
+            handle_message({'action': ACTIONS['CSS_ENABLE'], 'target': message['target']})
+        elif message['action'] == ACTIONS['CSS_DISABLE']:
+            setup = lambda: handle_message({'action': ACTIONS['CSS_ENABLE'], 'target': 'userChrome'})
+
+        name = 'daemon.handle_message (%s)' % message['action']
+        results.append(run_benchmark(name, lambda: handle_message(message), iterations, setup=setup))
+
+    daemon.actions.shutdown()
+    daemon.socket_server.close()
+    return results
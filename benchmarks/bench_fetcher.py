@@ -0,0 +1,13 @@
+from .common import run_benchmark, write_pywal_colors
+
+def run(iterations):
+    """Benchmarks reading the pywal colors with a cold and a warm cache."""
+    from pywalfox import fetcher
+    from pywalfox.config import PYWAL_COLORS_PATH
+
+    write_pywal_colors(PYWAL_COLORS_PATH)
+
+    return [
+        run_benchmark('fetcher.get_pywal_colors (cold)', fetcher.get_pywal_colors, iterations, setup=fetcher.invalidate_cache),
+        run_benchmark('fetcher.get_pywal_colors (warm)', fetcher.get_pywal_colors, iterations),
+    ]
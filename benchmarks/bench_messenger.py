@@ -0,0 +1,35 @@
+import os
+
+from .common import run_benchmark
+
+def run(iterations):
+    """Benchmarks encoding and decoding native messages, over a pipe."""
+    from pywalfox.messenger import Messenger
+    from pywalfox.response import Message
+    from pywalfox.config import ACTIONS
+
+    messenger = Messenger(3)
+    colors = ['#%06x' % (i * 0x0f0f0f) for i in range(16)]
+    small = {'action': ACTIONS['VERSION'], 'success': True, 'data': '2.9.0'}
+    large = {'action': ACTIONS['COLORS'], 'success': True, 'data': {'colors': colors, 'wallpaper': '/home/user/wallpaper.png'}}
+
+    read_fd, write_fd = os.pipe()
+    reader = os.fdopen(read_fd, 'rb')
+    writer = os.fdopen(write_fd, 'wb')
+    messenger.stdin = reader
+    messenger.stdout = writer
+
+    def round_trip(message):
+        messenger.send_message(Message(message['action'], data=message['data']))
+        messenger.get_message()
+
+    results = [
+        run_benchmark('messenger.encode_message (small)', lambda: messenger.encode_message(small), iterations),
+        run_benchmark('messenger.encode_message (colors)', lambda: messenger.encode_message(large), iterations),
+        run_benchmark('messenger.pipe_round_trip (small)', lambda: round_trip(small), iterations),
+        run_benchmark('messenger.pipe_round_trip (colors)', lambda: round_trip(large), iterations),
+    ]
+
+    reader.close()
+    writer.close()
+    return results
@@ -0,0 +1,48 @@
+import os
+import sys
+import select
+
+from .common import run_benchmark, write_pywal_colors
+
+def run(iterations):
+    """
+    Benchmarks the latency from a CLI command being sent on the UNIX socket
+    until the resulting message has been written to the daemon's stdout.
+    """
+    if sys.platform.startswith('win32'):
+        return []
+
+    from pywalfox.daemon import Daemon
+    from pywalfox.settings import save_settings, flush_settings
+    from pywalfox.channel.unix.client import Client
+    from pywalfox.config import COMMANDS, PYWAL_COLORS_PATH
+
+    write_pywal_colors(PYWAL_COLORS_PATH)
+
+    # Measure the socket path itself rather than the coalescing window
+    save_settings({'coalesce_window': 0})
+    flush_settings()
+
+    read_fd, write_fd = os.pipe()
+    daemon = Daemon(3)
+    daemon.messenger.stdout = os.fdopen(write_fd, 'wb')
+    daemon.messenger.start_writer()
+    daemon.start_socket_server()
+
+    client = Client()
+    client.connect(daemon.socket_server.host)
+
+    def send_and_wait():
+        client.send_message(COMMANDS['UPDATE'])
+        select.select([read_fd], [], [])
+        os.read(read_fd, 65536)
+
+    results = [
+        run_benchmark('socket.cli_to_stdout (%s)' % COMMANDS['UPDATE'], send_and_wait, iterations),
+    ]
+
+    client.close()
+    daemon.messenger.close()
+    daemon.socket_server.close()
+    os.close(read_fd)
+    return results
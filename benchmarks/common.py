@@ -0,0 +1,134 @@
+import os
+import sys
+import json
+import time
+import logging
+import tempfile
+import tracemalloc
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def setup_environment():
+    """
+    Points HOME, the XDG directories and the temporary directory at a scratch directory,
+    so that the benchmarks never touch the real pywal cache, settings, Firefox profiles
+    or daemon socket. Must be called before anything from pywalfox is imported.
+
+    :return: the path to the scratch directory
+    :rType: str
+    """
+    scratch = tempfile.mkdtemp(prefix='pywalfox-bench-')
+    for name in ('home', 'cache', 'config', 'tmp'):
+        os.makedirs(os.path.join(scratch, name))
+
+    os.environ['HOME'] = os.path.join(scratch, 'home')
+    os.environ['XDG_CACHE_HOME'] = os.path.join(scratch, 'cache')
+    os.environ['XDG_CONFIG_HOME'] = os.path.join(scratch, 'config')
+    os.environ['TMPDIR'] = os.path.join(scratch, 'tmp')
+
+    if ROOT_PATH not in sys.path:
+        sys.path.insert(0, ROOT_PATH)
+
+    # Same level as the daemon when not in verbose mode, without writing a log file
+    logging.getLogger().setLevel(logging.ERROR)
+    logging.getLogger().addHandler(logging.NullHandler())
+
+    return scratch
+
+def write_pywal_colors(path, seed=0):
+    """
+    Writes a pywal-shaped colors.json.
+
+    :param path str: the path to write to
+    :param seed int: changes the generated colors
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    colors = dict(('color%d' % i, '#%06x' % ((i * 0x0f0f0f + seed) & 0xffffff)) for i in range(16))
+    with open(path, 'w') as f:
+        json.dump({
+            'wallpaper': '/home/user/wallpaper.png',
+            'alpha': '100',
+            'special': {'background': colors['color0'], 'foreground': colors['color15'], 'cursor': colors['color15']},
+            'colors': colors,
+        }, f, indent=4)
+
+
+class NullWriter:
+    """A binary stdout replacement that discards everything written to it."""
+    def __init__(self):
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+def percentile(sorted_values, fraction):
+    """
+    Gets a percentile from a sorted list using the nearest-rank method.
+
+    :param sorted_values list: the sorted values
+    :param fraction float: the percentile, e.g. 0.99
+    :return: the value at the percentile
+    """
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def run_benchmark(name, operation, iterations, setup=None, warmup=20):
+    """
+    Runs an operation repeatedly and measures its latency and memory use.
+
+    Latency is measured per call with perf_counter_ns. Memory is measured in a
+    second pass with tracemalloc, as the peak number of bytes allocated during a
+    call (transient allocations included) and the net number of memory blocks
+    still allocated afterwards.
+
+    :param name str: the name of the benchmark
+    :param operation function: called without arguments once per iteration
+    :param iterations int: the number of timed calls
+    :param setup function: called before each call, outside of the measurement
+    :param warmup int: the number of untimed calls before measuring
+    :return: the results
+    :rType: dict
+    """
+    for _ in range(warmup):
+        if setup is not None:
+            setup()
+        operation()
+
+    timings = []
+    for _ in range(iterations):
+        if setup is not None:
+            setup()
+
+        start = time.perf_counter_ns()
+        operation()
+        timings.append(time.perf_counter_ns() - start)
+
+    memory_iterations = max(1, iterations // 10)
+    peak_bytes = 0
+    tracemalloc.start()
+    blocks_before = sys.getallocatedblocks()
+    for _ in range(memory_iterations):
+        if setup is not None:
+            setup()
+
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        operation()
+        _, peak = tracemalloc.get_traced_memory()
+        peak_bytes += peak - current
+    blocks_after = sys.getallocatedblocks()
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'name': name,
+        'iterations': iterations,
+        'p50_us': round(percentile(timings, 0.5) / 1000, 2),
+        'p99_us': round(percentile(timings, 0.99) / 1000, 2),
+        'peak_bytes_per_op': int(peak_bytes / memory_iterations),
+        'net_blocks_per_op': round((blocks_after - blocks_before) / memory_iterations, 2),
+    }
@@ -0,0 +1,125 @@
+"""
+Benchmarks for the native messaging and control socket hot paths.
+
+Usage:
+    python -m benchmarks.run [--iterations N] [--only SUITE] [--json]
+    python -m benchmarks.run --save benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json [--threshold 1.5]
+
+Reports the p50 and p99 latency in microseconds, the peak number of bytes
+allocated per operation and the net number of memory blocks left allocated per
+operation. When comparing, the run fails if the p50 latency or the peak
+allocations of a benchmark exceed the baseline by more than the threshold factor.
+"""
+import sys
+import json
+import argparse
+
+from .common import setup_environment
+
+SUITES = ['messenger', 'fetcher', 'daemon', 'socket']
+
+def load_suite(name):
+    """
+    Imports a benchmark suite.
+
+    :param name str: the name of the suite
+    :return: the suite module
+    """
+    if name == 'messenger':
+        from . import bench_messenger as suite
+    elif name == 'fetcher':
+        from . import bench_fetcher as suite
+    elif name == 'daemon':
+        from . import bench_daemon as suite
+    else:
+        from . import bench_socket as suite
+
+    return suite
+
+def print_results(results):
+    """
+    Prints the results as a table.
+
+    :param results list: the benchmark results
+    """
+    print('%-48s %10s %10s %12s %10s' % ('benchmark', 'p50 (us)', 'p99 (us)', 'peak B/op', 'blocks/op'))
+    for result in results:
+        print('%-48s %10.2f %10.2f %12d %10.2f' % (
+            result['name'],
+            result['p50_us'],
+            result['p99_us'],
+            result['peak_bytes_per_op'],
+            result['net_blocks_per_op'],
+        ))
+
+def compare_results(results, baseline_path, threshold):
+    """
+    Compares results against a saved baseline.
+
+    :param results list: the benchmark results
+    :param baseline_path str: the path to the baseline JSON file
+    :param threshold float: the factor by which a benchmark may exceed the baseline
+    :return: the names of the benchmarks that regressed
+    :rType: list
+    """
+    with open(baseline_path, 'r') as f:
+        baseline = dict((result['name'], result) for result in json.load(f)['results'])
+
+    regressions = []
+    print('')
+    print('%-48s %12s %12s' % ('compared to baseline', 'p50', 'peak B/op'))
+    for result in results:
+        base = baseline.get(result['name'])
+        if base is None:
+            print('%-48s %12s %12s' % (result['name'], 'new', 'new'))
+            continue
+
+        time_ratio = result['p50_us'] / max(base['p50_us'], 0.01)
+        memory_ratio = (result['peak_bytes_per_op'] + 1) / (base['peak_bytes_per_op'] + 1)
+        regressed = time_ratio > threshold or memory_ratio > threshold
+        if regressed:
+            regressions.append(result['name'])
+
+        print('%-48s %11.2fx %11.2fx%s' % (result['name'], time_ratio, memory_ratio, ' REGRESSED' if regressed else ''))
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs the pywalfox benchmarks')
+    parser.add_argument('--iterations', type=int, default=2000, help='timed iterations per benchmark (default: %(default)s)')
+    parser.add_argument('--only', choices=SUITES, action='append', help='only run the given suite, may be repeated')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    parser.add_argument('--save', metavar='PATH', help='save the results as a baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare the results against a baseline')
+    parser.add_argument('--threshold', type=float, default=1.5, help='allowed slowdown factor when comparing (default: %(default)s)')
+    args = parser.parse_args()
+
+    setup_environment()
+
+    results = []
+    for name in args.only or SUITES:
+        results.extend(load_suite(name).run(args.iterations))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'python': '%d.%d.%d' % sys.version_info[:3],
+                'platform': sys.platform,
+                'iterations': args.iterations,
+                'results': results,
+            }, f, indent=2)
+            f.write('\n')
+
+    if args.compare:
+        regressions = compare_results(results, args.compare, args.threshold)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
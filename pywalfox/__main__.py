@@ -1,80 +1,126 @@
 import os
 import sys
-import atexit
 import logging
-import argparse
-import subprocess
-
-from .daemon import Daemon
-from .utils.logger import setup_logging
-from .config import DAEMON_VERSION, LOG_FILE_PATH, COMMANDS, EXECUTABLE_PATH
-from .settings import save_settings
-
-if sys.platform.startswith('win32'):
-    from .channel.win.client import Client
-else:
-    from .channel.unix.client import Client
-
-# This is an ugly fix that is needed to be able to execute
-# pywalfox from Firefox without using a separate shell script.
-#
-# Firefox passes in a few arguments to the executable which are not valid
-# arguments for the executable. To circumvent this, we need to ignore the
-# errors and simply start the executable anyway.
-#
-# https://developer.mozilla.org/en-US/docs/Mozilla/Add-ons/WebExtensions/Native_messaging#exchanging_messages
-def handle_error(self, message=None):
-    if len(sys.argv) == 3 and sys.argv[2] == 'pywalfox@frewacom.org':
-        apply_saved_profile_path()
-        setup_logging(False, False)
-        run_daemon()
-    else:
+
+from .config import DAEMON_VERSION, LOG_FILE_PATH, COMMANDS, EXECUTABLE_PATH, CLIENT_ACK_TIMEOUT, PROFILE_CLIENT_TIMEOUT, EXTENSION_ID
+
+# Only the modules needed by every code path are imported here. The daemon,
+# the socket client, argparse and the settings are imported by the code paths
+# that use them, which keeps short-lived CLI invocations and the start of the
+# native messaging host fast.
+
+def is_launched_by_firefox():
+    """
+    Checks if the executable was started by Firefox as a native messaging host.
+
+    Firefox passes in the path to the host manifest and the ID of the extension,
+    which are not valid arguments for the CLI.
+    https://developer.mozilla.org/en-US/docs/Mozilla/Add-ons/WebExtensions/Native_messaging#exchanging_messages
+
+    :return: if the executable was launched by Firefox
+    :rType: bool
+    """
+    return len(sys.argv) >= 3 and sys.argv[2] == EXTENSION_ID
+
+def handle_error(parser):
+    """
+    Creates an argparse error handler that prints the help text instead of just the usage.
+
+    :param parser ArgumentParser: the parser to print the help text of
+    """
+    def error(message=None):
         parser.print_help()
         sys.exit(1)
 
-parser = argparse.ArgumentParser(description='Pywalfox native messaging host v%s' % DAEMON_VERSION)
-
-# Register custom error handler
-parser.error = handle_error
-
-setup_group = parser.add_argument_group('install/uninstall')
-start_group = parser.add_argument_group('start')
-parser.add_argument('action',
-        nargs='?',
-        default=None,
-        metavar='ACTION',
-        help='available actions are install, uninstall, start, update, log, dark, light and auto')
-parser.add_argument('-v', '--version',
-        dest='version',
-        action='store_true',
-        help='displays current version of daemon')
-start_group.add_argument('-p', '--print',
-        dest='print_mode',
-        action='store_true',
-        help='writes debugging output from native messaging host to stdout')
-start_group.add_argument('--verbose',
-        dest='verbose',
-        action='store_true',
-        help='runs native messaging host in verbose mode')
-setup_group.add_argument('-g', '--global',
-        dest='global_install',
-        action='store_true',
-        help='installs/uninstalls native host manifest globally')
-setup_group.add_argument('--executable',
-        dest='custom_path',
-        nargs='?',
-        type=str,
-        help='use a custom path for the `pywalfox` executable')
-setup_group.add_argument('--manifest-path',
-        dest='manifest_path',
-        type=str,
-        default=None,
-        help='overrides native messaging host manifest directory path')
-setup_group.add_argument('--profile-path',
-        dest='profile_path',
-        type=str,
-        default=None,
-        help='overrides profiles directory path')
+    return error
+
+def create_parser():
+    """
+    Creates the CLI argument parser.
+
+    :return: the parser
+    :rType: ArgumentParser
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Pywalfox native messaging host v%s' % DAEMON_VERSION)
+
+    # Register custom error handler
+    parser.error = handle_error(parser)
+
+    setup_group = parser.add_argument_group('install/uninstall')
+    start_group = parser.add_argument_group('start')
+    client_group = parser.add_argument_group('update/dark/light/auto')
+    parser.add_argument('actions',
+            nargs='*',
+            metavar='ACTION',
+            help='available actions are install, uninstall, start, update, log, logs, stats, profile, dark, light and auto. '
+                 'update, dark, light and auto can be combined, e.g. `pywalfox dark update`')
+    parser.add_argument('-v', '--version',
+            dest='version',
+            action='store_true',
+            help='displays current version of daemon')
+    start_group.add_argument('-p', '--print',
+            dest='print_mode',
+            action='store_true',
+            help='writes debugging output from native messaging host to stdout')
+    start_group.add_argument('--verbose',
+            dest='verbose',
+            action='store_true',
+            help='runs native messaging host in verbose mode')
+    start_group.add_argument('--asyncio',
+            dest='use_asyncio',
+            action='store_true',
+            help='runs native messaging host on an asyncio event loop (not supported on Windows)')
+    start_group.add_argument('--log-format',
+            dest='log_format',
+            choices=['text', 'json'],
+            default=None,
+            help='format of the log file, overrides the \'log_format\' setting (default: text)')
+    start_group.add_argument('--profile',
+            dest='profile',
+            action='store_true',
+            help='profiles native messaging host from the start, until `pywalfox profile` or SIGUSR1 is received')
+    client_group.add_argument('--timeout',
+            dest='timeout',
+            type=float,
+            default=None,
+            help='seconds to wait for the daemon to acknowledge the commands (default: %s, %s with profile)'
+                 % (CLIENT_ACK_TIMEOUT, PROFILE_CLIENT_TIMEOUT))
+    client_group.add_argument('--stdin',
+            dest='palette_stdin',
+            action='store_true',
+            help='with update, sends a palette read from stdin instead of reading the Pywal colors file')
+    client_group.add_argument('--file',
+            dest='palette_file',
+            type=str,
+            default=None,
+            help='with update, sends the palette in a file instead of reading the Pywal colors file')
+    parser.add_argument('--json',
+            dest='stats_json',
+            action='store_true',
+            help='with stats or logs, prints the statistics or log records as JSON')
+    setup_group.add_argument('-g', '--global',
+            dest='global_install',
+            action='store_true',
+            help='installs/uninstalls native host manifest globally')
+    setup_group.add_argument('--executable',
+            dest='custom_path',
+            nargs='?',
+            type=str,
+            help='use a custom path for the `pywalfox` executable')
+    setup_group.add_argument('--manifest-path',
+            dest='manifest_path',
+            type=str,
+            default=None,
+            help='overrides native messaging host manifest directory path')
+    setup_group.add_argument('--profile-path',
+            dest='profile_path',
+            type=str,
+            default=None,
+            help='overrides profiles directory path')
+
+    return parser
 
 def apply_saved_profile_path(cli_override=None):
     """
@@ -87,7 +133,7 @@ def apply_saved_profile_path(cli_override=None):
         path = get_setting('profile_path')
 
     if path is not None:
-        from pywalfox.custom_css import set_profile_path_override
+        from pywalfox.profiles import set_profile_path_override
         set_profile_path_override(path)
 
 def get_python_version():
@@ -95,44 +141,226 @@ def get_python_version():
     python_version = sys.version_info
     version_label = '%s.%s.%s' % (python_version[0], python_version[1], python_version[2])
     if python_version < (3, 6):
-        logging.error('Python version %s is not supported' % version_label)
+        logging.error('Python version %s is not supported', version_label)
         sys.exit(1)
     else:
-        logging.debug('Using python %s' % version_label)
+        logging.debug('Using python %s', version_label)
 
     return python_version
 
-def send_client_command(message):
+def request_daemons(commands, timeout):
+    """
+    Sends a batch of commands to every running daemon and collects their acknowledgements.
+
+    :param commands list: the commands to send, either strings or {'command', ...} objects
+    :param timeout float: the number of seconds to wait for acknowledgements
+    :return: (number of daemons the batch was sent to, acknowledgements, latency in ms)
+    :rType: tuple
     """
-    Sends a message to the socket server.
+    import json
+    import time
+    import select
 
-    :param message str: the message to send
+    if sys.platform.startswith('win32'):
+        from pywalfox.channel.win.client import Client, get_endpoints
+    else:
+        from pywalfox.channel.unix.client import Client
+        from pywalfox.channel.unix.endpoints import get_endpoints
+
+    batch_id = '%d-%s' % (os.getpid(), os.urandom(4).hex())
+    message = json.dumps({'id': batch_id, 'commands': commands})
+
+    pending = []
+    acknowledgements = []
+    start_time = time.monotonic()
+    try:
+        for endpoint in get_endpoints():
+            client = Client()
+            if client.connect(endpoint) is True:
+                try:
+                    client.send_message(message)
+                    pending.append(client)
+                    continue
+                except OSError as e:
+                    logging.debug('Failed to send commands: %s', str(e))
+
+            client.close()
+
+        sent = len(pending)
+        deadline = start_time + timeout
+        while pending:
+            readable, _, _ = select.select(pending, [], [], max(0, deadline - time.monotonic()))
+            if not readable:
+                break
+
+            for client in readable:
+                replies = client.read_messages()
+                if replies is None:
+                    pending.remove(client)
+                    client.close()
+                    continue
+
+                for reply in replies:
+                    try:
+                        reply = json.loads(reply)
+                        if reply.get('id') == batch_id:
+                            acknowledgements.append(reply)
+                            pending.remove(client)
+                            client.close()
+                            break
+                    except (ValueError, AttributeError):
+                        pass
+    finally:
+        for client in pending:
+            client.close()
+
+    return (sent, acknowledgements, (time.monotonic() - start_time) * 1000)
+
+def send_client_commands(commands, timeout=CLIENT_ACK_TIMEOUT):
+    """
+    Sends a batch of commands to every running daemon and waits for them to acknowledge it.
+
+    :param commands list: the commands to send, either strings or {'command', ...} objects
+    :param timeout float: the number of seconds to wait for acknowledgements
+    :return: the exit status; 0 if delivered, 1 if no daemon was found, 2 if it was not acknowledged
+             in time and 3 if a daemon could not handle a command
+    :rType: int
     """
-    client = Client()
+    (sent, acknowledgements, latency) = request_daemons(commands, timeout)
+    errors = [error for reply in acknowledgements for error in reply.get('errors', [])]
+    if errors:
+        for error in sorted(set(errors)):
+            print('The daemon could not handle a command: %s' % error, file=sys.stderr)
+        return 3
+
+    if len(acknowledgements) > 0 and len(acknowledgements) == sent:
+        print('Delivered %d command(s) to %d daemon(s) in %.1f ms' % (len(commands), sent, latency))
+        return 0
+
+    if sent > 0:
+        print('%d of %d daemon(s) did not acknowledge the command(s) within %.1f s'
+              % (sent - len(acknowledgements), sent, timeout), file=sys.stderr)
+        return 2
+
+    print('Could not find a running daemon', file=sys.stderr)
+    return 1
+
+def show_stats(as_json, timeout):
+    """
+    Prints the statistics of every running daemon.
 
-    for host in client.hosts:
-        connected = client.connect(host)
-        if connected is True:
-            client.send_message(message)
+    :param as_json bool: print JSON instead of text
+    :param timeout float: the number of seconds to wait for the daemons to reply
+    :return: the exit status; 0 if statistics were received, otherwise 1
+    :rType: int
+    """
+    import json
+    from pywalfox.stats import format_snapshot
 
-def send_update_action():
-    """Sends an update command to the addon, triggering a refetch of colors"""
-    send_client_command(COMMANDS['UPDATE'])
+    (sent, acknowledgements, _) = request_daemons([COMMANDS['STATS']], timeout)
+    snapshots = [result for reply in acknowledgements for result in reply.get('results', [])]
+    if not snapshots:
+        print('Could not get statistics from a running daemon', file=sys.stderr)
+        return 1
 
-def send_theme_mode_dark():
-    save_settings({'theme_mode': 'dark'})
-    print('Saved theme mode: dark')
-    send_client_command(COMMANDS['THEME_MODE_DARK'])
+    if as_json:
+        print(json.dumps(snapshots, indent=2, sort_keys=True))
+    else:
+        for snapshot in snapshots:
+            daemon = snapshot.get('daemon', {})
+            print('daemon %s (v%s, %s)' % (daemon.get('pid'), daemon.get('version'), daemon.get('runtime')))
+            for name in sorted(key for key in daemon if key not in ('pid', 'version', 'runtime')):
+                print('  %s: %s' % (name, daemon[name]))
+            print(format_snapshot(snapshot))
+            print('')
+
+    return 0
+
+def show_logs(as_json, timeout):
+    """
+    Prints the recent log records that every running daemon keeps in memory.
+
+    :param as_json bool: print one JSON object per record instead of text
+    :param timeout float: the number of seconds to wait for the daemons to reply
+    :return: the exit status; 0 if records were received, otherwise 1
+    :rType: int
+    """
+    import json
+
+    (sent, acknowledgements, _) = request_daemons([COMMANDS['LOGS']], timeout)
+    results = [result for reply in acknowledgements for result in reply.get('results', [])]
+    if not results:
+        print('Could not get the log from a running daemon', file=sys.stderr)
+        return 1
+
+    for result in results:
+        for record in result['records']:
+            if as_json:
+                print(json.dumps(dict(record, pid=result['pid'])))
+                continue
+
+            print('%s [%s] %s %s: %s' % (result['pid'], record['time'], record['thread'], record['level'], record['message']))
+            if 'exception' in record:
+                print(record['exception'])
+
+    return 0
+
+def toggle_profiling(timeout):
+    """
+    Starts or stops profiling in every running daemon.
+
+    :param timeout float: the number of seconds to wait for the daemons to reply
+    :return: the exit status; 0 if profiling was toggled, 1 if no daemon was found,
+             2 if a daemon did not reply in time and 3 on errors
+    :rType: int
+    """
+    (sent, acknowledgements, _) = request_daemons([COMMANDS['PROFILE']], timeout)
+    errors = [error for reply in acknowledgements for error in reply.get('errors', [])]
+    for error in errors:
+        print('The daemon could not toggle profiling: %s' % error, file=sys.stderr)
+
+    results = [result for reply in acknowledgements for result in reply.get('results', [])]
+    for result in results:
+        if result['profiling']:
+            print('daemon %s: started profiling' % result['pid'])
+        else:
+            print('daemon %s: stopped profiling, wrote %s' % (result['pid'], ', '.join(result['files'])))
+
+    if errors:
+        return 3
+
+    if sent == 0:
+        print('Could not find a running daemon', file=sys.stderr)
+        return 1
+
+    if len(acknowledgements) < sent:
+        print('%d of %d daemon(s) did not reply within %.1f s, profiling may still be toggled'
+              % (sent - len(acknowledgements), sent, timeout), file=sys.stderr)
+        return 2
+
+    return 0
+
+def save_theme_mode(mode):
+    """
+    Persists the theme mode so that it is applied when the daemon is started.
+
+    :param mode str: the theme mode (dark/light/auto)
+    """
+    from pywalfox.settings import save_settings, flush_settings
+    save_settings({'theme_mode': mode})
+    flush_settings()
+    print('Saved theme mode: %s' % mode)
 
-def send_theme_mode_light():
-    save_settings({'theme_mode': 'light'})
-    print('Saved theme mode: light')
-    send_client_command(COMMANDS['THEME_MODE_LIGHT'])
+CLIENT_ACTIONS = {
+    'update': COMMANDS['UPDATE'],
+    'dark': COMMANDS['THEME_MODE_DARK'],
+    'light': COMMANDS['THEME_MODE_LIGHT'],
+    'auto': COMMANDS['THEME_MODE_AUTO'],
+}
 
-def send_theme_mode_auto():
-    save_settings({'theme_mode': 'auto'})
-    print('Saved theme mode: auto')
-    send_client_command(COMMANDS['THEME_MODE_AUTO'])
+THEME_MODE_ACTIONS = ['dark', 'light', 'auto']
+
+OTHER_ACTIONS = ['install', 'uninstall', 'start', 'log', 'logs', 'stats', 'profile']
 
 def open_log_file():
     """Opens the daemon log file in an editor."""
@@ -142,6 +370,7 @@ def open_log_file():
         else:
             editor = 'nano' # fallback
 
+        import subprocess
         subprocess.call([editor, LOG_FILE_PATH])
     else:
         print('No log file exists')
@@ -150,9 +379,33 @@ def print_version():
     """Prints the current version of the daemon."""
     print('v%s' % DAEMON_VERSION)
 
-def run_daemon():
-    """Starts the daemon."""
-    daemon = Daemon(get_python_version().major)
+def run_daemon(use_asyncio=False, profile=False):
+    """
+    Starts the daemon.
+
+    :param use_asyncio bool: use the asyncio runtime, also enabled by the 'runtime' setting
+    :param profile bool: start profiling before the daemon is created, see profiler.py
+    """
+    if profile:
+        from pywalfox.profiler import start_profiling
+        start_profiling()
+
+    if not use_asyncio:
+        from pywalfox.settings import get_setting
+        use_asyncio = get_setting('runtime') == 'asyncio'
+
+    if use_asyncio and sys.platform.startswith('win32'):
+        logging.error('The asyncio runtime is not supported on Windows, using the default runtime')
+        use_asyncio = False
+
+    if use_asyncio:
+        from pywalfox.async_daemon import AsyncDaemon
+        daemon = AsyncDaemon(get_python_version().major)
+    else:
+        from pywalfox.daemon import Daemon
+        daemon = Daemon(get_python_version().major)
+
+    import atexit
     atexit.register(daemon.close)
     daemon.start()
 
@@ -161,36 +414,122 @@ def no_executable():
     print('pywalfox install --executable <path-to-pywalfox-executable>')
     sys.exit(1)
 
-def handle_args(args):
-    """Handles CLI arguments."""
+def read_palette(path):
+    """
+    Reads a palette in the format of the Pywal colors file, e.g. generated by another tool.
+
+    :param path str: the path to the file, or None to read stdin
+    :return: the palette
+    :rType: object
+    """
+    import json
+
+    try:
+        if path is None:
+            return json.load(sys.stdin)
+
+        with open(os.path.expanduser(path), 'r') as f:
+            return json.load(f)
+    except (IOError, ValueError) as e:
+        print('Could not read the palette from %s: %s' % (path or 'stdin', str(e)), file=sys.stderr)
+        sys.exit(1)
+
+def handle_client_actions(actions, timeout, palette=None):
+    """
+    Sends the commands for one or more client actions to the daemon as one batch.
+
+    :param actions list: the actions, e.g. ['dark', 'update']
+    :param timeout float: the number of seconds to wait for an acknowledgement
+    :param palette object: a palette to send with the update action, see read_palette
+    """
+    commands = []
+    for action in actions:
+        if action in THEME_MODE_ACTIONS:
+            save_theme_mode(action)
+
+        if action == 'update' and palette is not None:
+            commands.append({'command': COMMANDS['SET_COLORS'], 'palette': palette})
+        else:
+            commands.append(CLIENT_ACTIONS[action])
+
+    sys.exit(send_client_commands(commands, timeout))
+
+def start_logging(verbose, print_mode, log_format=None):
+    """
+    Sets up logging with the 'log_format' and 'log_ring' settings, see utils/logger.py.
+    'log_ring' is true by default, false to keep no records in memory or 'debug' to keep debug messages.
+
+    :param verbose bool: if debug messages should be saved/printed
+    :param print_mode bool: whether or not to print to the terminal
+    :param log_format str: overrides the 'log_format' setting
+    """
+    from pywalfox.settings import get_setting
+    from pywalfox.utils.logger import setup_logging
+
+    if log_format is None:
+        log_format = get_setting('log_format', 'text')
+
+    ring = get_setting('log_ring', True)
+    setup_logging(verbose, print_mode, log_format, ring is not False, ring == 'debug')
+
+def start_native_host():
+    """Starts the daemon as a native messaging host launched by Firefox."""
+    apply_saved_profile_path()
+    start_logging(False, False)
+    run_daemon()
+    sys.exit(0)
+
+def handle_args(parser, args):
+    """
+    Handles CLI arguments.
+
+    :param parser ArgumentParser: the parser that parsed the arguments
+    :param args Namespace: the parsed arguments
+    """
     if args.version:
         print_version()
         sys.exit(0)
 
-    if args.action == 'update':
-        send_update_action()
-        sys.exit(0)
+    if args.timeout is None:
+        args.timeout = PROFILE_CLIENT_TIMEOUT if args.actions == ['profile'] else CLIENT_ACK_TIMEOUT
 
-    if args.action == 'dark':
-        send_theme_mode_dark()
-        sys.exit(0)
+    unknown_actions = [action for action in args.actions if action not in CLIENT_ACTIONS and action not in OTHER_ACTIONS]
+    if len(unknown_actions) > 0:
+        parser.error('invalid action: %s' % ', '.join(unknown_actions))
 
-    if args.action == 'light':
-        send_theme_mode_light()
-        sys.exit(0)
+    if (args.palette_stdin or args.palette_file) and 'update' not in args.actions:
+        parser.error('--stdin and --file can only be used with update')
 
-    if args.action == 'auto':
-        send_theme_mode_auto()
-        sys.exit(0)
+    if len(args.actions) > 0 and all(action in CLIENT_ACTIONS for action in args.actions):
+        palette = None
+        if args.palette_stdin or args.palette_file:
+            palette = read_palette(args.palette_file)
+
+        handle_client_actions(args.actions, args.timeout, palette)
+
+    if len(args.actions) > 1:
+        parser.error('only update, dark, light and auto can be combined')
+
+    args.action = args.actions[0] if len(args.actions) > 0 else None
 
     if args.action == 'log':
         open_log_file()
         sys.exit(0)
 
+    if args.action == 'stats':
+        sys.exit(show_stats(args.stats_json, args.timeout))
+
+    if args.action == 'logs':
+        sys.exit(show_logs(args.stats_json, args.timeout))
+
+    if args.action == 'profile':
+        sys.exit(toggle_profiling(args.timeout))
+
     if args.action == 'start':
         apply_saved_profile_path(args.profile_path)
-        setup_logging(args.verbose, args.print_mode)
-        run_daemon()
+        start_logging(args.verbose, args.print_mode, args.log_format)
+        run_daemon(args.use_asyncio, args.profile)
+        sys.exit(0)
 
     if args.action == 'install':
         from pywalfox.install import start_setup
@@ -215,8 +554,9 @@ def handle_args(args):
                      manifest_path=args.manifest_path)
 
         if args.profile_path:
-            from pywalfox.settings import save_settings
+            from pywalfox.settings import save_settings, flush_settings
             save_settings({'profile_path': args.profile_path})
+            flush_settings()
             print('Saved custom Firefox profile path: %s' % args.profile_path)
         else:
             print('')
@@ -236,8 +576,11 @@ def handle_args(args):
 
 def main():
     """Application entry point."""
-    args = parser.parse_args()
-    handle_args(args)
+    if is_launched_by_firefox():
+        start_native_host()
+
+    parser = create_parser()
+    handle_args(parser, parser.parse_args())
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,156 @@
+import os
+import signal
+import asyncio
+import logging
+
+from .daemon import Daemon
+from .config import COLORS_DEBOUNCE_DELAY
+
+
+class AsyncDaemon(Daemon):
+    """
+    Runs the daemon on an asyncio event loop instead of a stdin loop and a socket thread.
+
+    Both stdin and the socket server are watched by the same selector, and all
+    messages and commands are handled on the loop thread. Named timers can be
+    scheduled with 'schedule' and are cancelled when the daemon stops.
+    Only supported on platforms where the event loop can watch pipes (not win32).
+
+    :param python_version str: the current major python version
+    """
+    def __init__(self, python_version):
+        Daemon.__init__(self, python_version)
+        self.loop = None
+        self.stopped = None
+        self.timers = {}
+        self.stdin_fd = self.messenger.stdin.fileno()
+
+    def schedule(self, name, delay, callback, *args):
+        """
+        Calls a function after a delay. Scheduling a timer with the same name as a
+        pending timer replaces it, which makes it usable for debouncing.
+
+        :param name str: the name of the timer
+        :param delay float: the number of seconds to wait
+        :param callback function: the function to call
+        """
+        self.cancel_timer(name)
+        self.timers[name] = self.loop.call_later(delay, self.run_timer, name, callback, args)
+
+    def run_timer(self, name, callback, args):
+        """Runs a scheduled timer callback."""
+        self.timers.pop(name, None)
+        callback(*args)
+
+    def cancel_timer(self, name):
+        """
+        Cancels a pending timer.
+
+        :param name str: the name of the timer
+        """
+        timer = self.timers.pop(name, None)
+        if timer is not None:
+            timer.cancel()
+
+    def on_stdin_readable(self):
+        """Reads the available data from stdin and handles the complete messages."""
+        try:
+            data = os.read(self.stdin_fd, 65536)
+        except OSError as e:
+            logging.error('Failed to read from stdin: %s', str(e))
+            data = None
+
+        if not data:
+            logging.debug('stdin was closed')
+            self.stop()
+            return
+
+        for message in self.messenger.decode_frames(data):
+            logging.debug('Received message from extension: %s', message)
+            self.handle_message(message)
+
+    def on_socket_readable(self):
+        """Accepts a connection to the socket server and adds it to the event loop."""
+        connection = self.socket_server.accept_connection()
+        if connection is not None:
+            self.loop.add_reader(connection.fileno(), self.on_connection_readable, connection)
+
+    def on_connection_readable(self, connection):
+        """
+        Reads and handles the commands that are waiting on a connection.
+
+        :param connection Connection: the connection to a client
+        """
+        received = self.socket_server.read_connection(connection)
+        if received is None:
+            self.loop.remove_reader(connection.fileno())
+            self.socket_server.close_connection(connection)
+            return
+
+        self.process_commands(received)
+
+    def update_pywal_colors(self):
+        """
+        Sends the colors in the Pywal cache file, dropping a pushed palette.
+        Repeated updates are debounced, the colors are sent once the updates stop for COLORS_DEBOUNCE_DELAY.
+        """
+        logging.debug('Update pywal colors (debounced)')
+        self.clear_colors_override()
+        self.schedule('update', COLORS_DEBOUNCE_DELAY, self.push_pywal_colors)
+
+    def on_colors_changed(self):
+        """Called from the colors watcher thread, hands the change over to the loop."""
+        self.loop.call_soon_threadsafe(Daemon.on_colors_changed, self)
+
+    def start_socket_server(self):
+        """Starts the socket server and adds it to the event loop."""
+        if self.socket_server.start() is True:
+            self.loop.add_reader(self.socket_server.socket.fileno(), self.on_socket_readable)
+
+    def install_profile_signal(self):
+        """Toggles profiling on SIGUSR1, handled on the loop thread."""
+        self.loop.add_signal_handler(signal.SIGUSR1, self.toggle_profiling)
+        self.profile_signal_installed = True
+
+    def start(self):
+        """Starts the daemon and runs the event loop until stdin is closed or the daemon is stopped."""
+        self.loop = asyncio.new_event_loop()
+        self.stopped = self.loop.create_future()
+        self.is_running = True
+        self.install_profile_signal()
+        self.messenger.start_writer()
+        self.start_socket_server()
+        self.start_colors_watcher()
+        self.loop.add_reader(self.stdin_fd, self.on_stdin_readable)
+
+        try:
+            self.loop.run_until_complete(self.stopped)
+        finally:
+            self.shutdown_loop()
+
+    def stop(self):
+        """Stops the event loop. Safe to call from any thread."""
+        if self.loop is None or self.loop.is_closed():
+            return
+
+        def set_stopped():
+            if not self.stopped.done():
+                self.stopped.set_result(None)
+
+        self.loop.call_soon_threadsafe(set_stopped)
+
+    def shutdown_loop(self):
+        """Cancels pending timers, removes the watched file descriptors and closes the loop."""
+        for name in list(self.timers):
+            self.cancel_timer(name)
+
+        self.loop.remove_reader(self.stdin_fd)
+        if self.profile_signal_installed:
+            self.loop.remove_signal_handler(signal.SIGUSR1)
+        if self.socket_server.socket.fileno() != -1:
+            self.loop.remove_reader(self.socket_server.socket.fileno())
+        for connection in list(self.socket_server.connections.values()):
+            self.loop.remove_reader(connection.fileno())
+
+        self.loop.close()
+        self.is_running = False
@@ -1,8 +1,56 @@
+import os
+import time
+import select
 import socket
 import logging
-from ..config import UNIX_SOCKET_PATH, WIN_SOCKET_HOST, WIN_SOCKET_HOST_ALT
+from .framing import FrameReader, FrameError, encode_frame
+from ..config import UNIX_SOCKET_PATH, WIN_SOCKET_HOST, WIN_SOCKET_HOST_ALT, SOCKET_BUFFER_SIZE, SOCKET_MAX_FRAME_SIZE, SOCKET_MAX_CONNECTIONS
 
-class Connector:
+
+class Connection:
+    """
+    A stream socket that messages are sent and received on as length-prefixed frames.
+
+    :param sock socket: the connected socket
+    """
+    def __init__(self, sock):
+        self.socket = sock
+        self.reader = FrameReader(SOCKET_BUFFER_SIZE, SOCKET_MAX_FRAME_SIZE)
+
+    def fileno(self):
+        """Gets the file descriptor of the socket, which makes connections usable with select."""
+        return self.socket.fileno()
+
+    def read_messages(self):
+        """
+        Reads the available data and decodes the complete messages.
+
+        :return: the decoded messages, or None if the connection was closed or is invalid
+        :rType: list
+        """
+        try:
+            return self.reader.read(self.socket)
+        except (FrameError, UnicodeDecodeError) as e:
+            logging.error('Received invalid data on socket: %s', str(e))
+        except (socket.error, OSError) as e:
+            logging.debug('Failed to read from socket: %s', str(e))
+
+        return None
+
+    def send_message(self, message):
+        """
+        Encodes and sends a message as a single frame.
+
+        :param message str: the string to send
+        """
+        self.socket.sendall(encode_frame(message))
+
+    def close(self):
+        """Closes the socket connection."""
+        self.socket.close()
+
+
+class Connector(Connection):
     """
     Base class for the socket server and client.
     Depending on the current OS, a different socket type will be used,
@@ -17,81 +65,173 @@ class Connector:
                 self.host = self.get_win_socket_host()
 
             self.hosts = [WIN_SOCKET_HOST, WIN_SOCKET_HOST_ALT]
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            Connection.__init__(self, socket.socket(socket.AF_INET, socket.SOCK_STREAM))
             logging.debug('Setup socket server using AF_INET (win32)')
         else:
-            self.host = UNIX_SOCKET_PATH
-            self.hosts = [UNIX_SOCKET_PATH]
-            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.host = UNIX_SOCKET_PATH % os.getpid()
+            Connection.__init__(self, socket.socket(socket.AF_UNIX, socket.SOCK_STREAM))
             logging.debug('Setup socket server using AF_UNIX (linux/darwin)')
 
     def get_win_socket_host(self):
         """
-        Get an available host and port to bind the UDP-socket to.
+        Get an available host and port to bind the TCP-socket to.
 
-        :return: the host and port to be used when binding the UDP-socket
+        :return: the host and port to be used when binding the TCP-socket
         :rType: (host, port)
         """
         is_valid = True
-        test_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         try:
             test_socket.bind(WIN_SOCKET_HOST)
             test_socket.close()
         except OSError as e:
             is_valid = False
-            if e.errno == 98: # errno 98 means that address is already bound
-                logging.debug('Default UDP-socket host is already in use')
+            if e.errno in (98, 10048): # the address is already bound
+                logging.debug('Default TCP-socket host is already in use')
             else:
-                logging.error('Failed to test UDP-socket host availability: %s' % str(e))
+                logging.error('Failed to test TCP-socket host availability: %s', str(e))
 
         if is_valid is True:
             return WIN_SOCKET_HOST
 
         return WIN_SOCKET_HOST_ALT
 
-    def encode_message(self, message):
+
+class ConnectionServer(Connector):
+    """
+    Base class for the socket servers. Clients connect to the server socket and
+    send their messages as frames; replies are sent back on the same connection.
+
+    :param platform_id str: the current platform identifier, e.g. win32
+    """
+    def __init__(self, platform_id):
+        Connector.__init__(self, platform_id)
+        self.connections = {}
+
+    def listen(self):
+        """Starts accepting connections on the bound socket."""
+        self.socket.listen(SOCKET_MAX_CONNECTIONS)
+
+    def accept_connection(self):
         """
-        Encodes a message to be sent using the socket.
+        Accepts a pending connection.
 
-        :param message str: the message to encode into a bytestring
-        :return: the encoded message
-        :rType: bytestring
+        :return: the connection, or None if it could not be accepted
+        :rType: Connection
         """
-        return message.encode('utf-8')
+        try:
+            (sock, _) = self.socket.accept()
+        except (socket.error, OSError) as e:
+            logging.debug('Failed to accept connection: %s', str(e))
+            return None
+
+        if len(self.connections) >= SOCKET_MAX_CONNECTIONS:
+            logging.error('Too many open connections, closing the new connection')
+            sock.close()
+            return None
+
+        connection = Connection(sock)
+        self.connections[connection.fileno()] = connection
+        return connection
 
-    def decode_message(self, raw):
+    def read_connection(self, connection):
         """
-        Decodes a message received from the socket.
+        Reads the messages that are available on a connection.
 
-        :param raw bytestring: the raw message of bytes to decode
-        :return: the decoded message
-        :rType: str
+        :param connection Connection: the connection to read from
+        :return: a list of (decoded message, connection), or None if the connection was closed
+        :rType: list
         """
-        return raw.decode('utf-8')
+        messages = connection.read_messages()
+        if messages is None:
+            return None
 
-    def get_message(self):
+        return [(message, connection) for message in messages]
+
+    def close_connection(self, connection):
         """
-        Reads and decodes an incoming message.
+        Closes a connection to a client.
 
-        :return: the decoded data
-        :rType: str
+        :param connection Connection: the connection
         """
-        data = self.socket.recv(1024)
-        if not data:
-            logging.error('Failed to read data from socket')
-            return
+        self.connections.pop(connection.fileno(), None)
+        connection.close()
 
-        return self.decode_message(data)
+    def poll(self, timeout):
+        """
+        Accepts new connections and reads the messages of the connections that are readable.
 
-    def send_message(self, message):
+        :param timeout float: the number of seconds to wait for activity, or None to wait indefinitely
+        :return: a list of (decoded message, connection), or None if the server was closed
+        :rType: list
         """
-        Encodes and sends a message using the socket
+        try:
+            readable, _, _ = select.select([self.socket] + list(self.connections.values()), [], [], timeout)
+        except (ValueError, OSError):
+            # The server may be closed by another thread while waiting
+            if self.socket.fileno() == -1:
+                return None
+            raise
+
+        received = []
+        for sock in readable:
+            if sock is self.socket:
+                self.accept_connection()
+                continue
+
+            messages = self.read_connection(sock)
+            if messages is None:
+                self.close_connection(sock)
+            else:
+                received.extend(messages)
+
+        return received
 
-        :param data str: the string to send
+    def receive_messages(self):
         """
-        encoded_message = self.encode_message(message)
-        self.socket.send(encoded_message)
+        Waits until at least one message has been received.
+
+        :return: a list of (decoded message, connection), or None if the server was closed
+        :rType: list
+        """
+        while True:
+            received = self.poll(None)
+            if received is None or received:
+                return received
+
+    def get_pending_messages(self, timeout=0):
+        """
+        Reads all messages that arrive before a timeout, without blocking past it.
+
+        :param timeout float: the number of seconds to keep waiting for messages
+        :return: a list of (decoded message, connection)
+        :rType: list
+        """
+        received = []
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = max(0, deadline - time.monotonic())
+            messages = self.poll(remaining) or []
+            received.extend(messages)
+            if remaining == 0 and not messages:
+                return received
+
+    def send_reply(self, connection, message):
+        """
+        Sends a message to a client on its connection.
+
+        :param connection Connection: the connection the client sent a message on
+        :param message str: the string to send
+        """
+        try:
+            connection.send_message(message)
+        except (socket.error, OSError) as e:
+            logging.debug('Failed to send reply: %s', str(e))
+            self.close_connection(connection)
 
     def close(self):
-        """Closes the socket connection."""
+        """Closes all connections and the server socket."""
+        for connection in list(self.connections.values()):
+            self.close_connection(connection)
+
         self.socket.close()
@@ -0,0 +1,94 @@
+import struct
+
+# Same framing as the native messaging protocol, see Messenger
+FRAME_HEADER = struct.Struct('@I')
+
+def encode_frame(message):
+    """
+    Encodes a message as a length-prefixed frame.
+
+    :param message str: the message to encode
+    :return: the frame
+    :rType: bytes
+    """
+    data = message.encode('utf-8')
+    return FRAME_HEADER.pack(len(data)) + data
+
+
+class FrameError(Exception):
+    """Raised when a peer sends a frame that is larger than allowed."""
+
+
+class FrameReader:
+    """
+    Reads length-prefixed frames from a stream socket into a reusable buffer.
+
+    Data is received with recv_into directly into the buffer, and messages are
+    decoded straight from a view of it. The buffer only grows when a frame does
+    not fit, up to max_size.
+
+    :param buffer_size int: the initial size of the buffer
+    :param max_size int: the largest frame that is accepted
+    """
+    def __init__(self, buffer_size, max_size):
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.max_size = max_size
+        self.start = 0
+        self.end = 0
+
+    def reserve(self, size):
+        """
+        Makes room for at least size bytes after the unread data.
+
+        :param size int: the number of bytes needed
+        """
+        if self.start > 0:
+            # Move the unread data to the front of the buffer
+            pending = self.end - self.start
+            self.buffer[:pending] = self.view[self.start:self.end]
+            self.start = 0
+            self.end = pending
+
+        if len(self.buffer) - self.end < size:
+            self.view.release()
+            self.buffer.extend(bytes(self.end + size - len(self.buffer)))
+            self.view = memoryview(self.buffer)
+
+    def read(self, sock):
+        """
+        Receives the available data from a socket and decodes the complete frames.
+        Incomplete frames are kept until the rest is received.
+
+        :param sock socket: the socket to read from
+        :return: the decoded messages, or None if the peer closed the connection
+        :rType: list
+        """
+        if self.end == len(self.buffer):
+            self.reserve(FRAME_HEADER.size)
+
+        received = sock.recv_into(self.view[self.end:])
+        if received == 0:
+            return None
+
+        self.end += received
+        messages = []
+        while self.end - self.start >= FRAME_HEADER.size:
+            length = FRAME_HEADER.unpack_from(self.buffer, self.start)[0]
+            if length > self.max_size:
+                raise FrameError('frame of %d bytes exceeds the limit of %d bytes' % (length, self.max_size))
+
+            frame_end = self.start + FRAME_HEADER.size + length
+            if frame_end > self.end:
+                if frame_end - self.start > len(self.buffer):
+                    self.reserve(frame_end - self.end)
+                break
+
+            messages.append(str(self.view[self.start + FRAME_HEADER.size:frame_end], 'utf-8'))
+            self.start = frame_end
+
+        if self.start == self.end:
+            self.start = 0
+            self.end = 0
+
+        return messages
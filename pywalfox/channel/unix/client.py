@@ -1,16 +1,18 @@
 import os
 import logging
 from ..connector import Connector
+from .endpoints import remove_endpoint
 
 
 class Client(Connector):
-    """UNIX-socket client used to communicate with the daemon."""
+    """UNIX-socket client used to communicate with a daemon."""
     def __init__(self):
         Connector.__init__(self, 'unix', False)
 
     def connect(self, host):
         """
         Connects to the UNIX-socket if it exists.
+        The socket is removed if no daemon is listening on it anymore.
 
         :return: if the connection to the socket was successfull
         :rType: bool
@@ -18,11 +20,13 @@ class Client(Connector):
         if os.path.exists(host):
             try:
                 self.socket.connect(host)
-                logging.debug('Successfully connected to UNIX socket at: %s' % host)
+                logging.debug('Successfully connected to UNIX socket at: %s', host)
                 return True
+            except (ConnectionRefusedError, FileNotFoundError):
+                remove_endpoint(host)
             except OSError as e:
-                logging.error('Failed to connect to socket: %s' % e.strerror)
+                logging.error('Failed to connect to socket: %s', e.strerror)
         else:
-            logging.debug('Could not find socket: %s' % host)
+            logging.debug('Could not find socket: %s', host)
 
         return False
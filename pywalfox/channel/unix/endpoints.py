@@ -0,0 +1,95 @@
+import os
+import stat
+import errno
+import logging
+from ...config import UNIX_SOCKET_DIR
+
+ENDPOINT_PREFIX = 'daemon_'
+
+def check_endpoint_dir():
+    """
+    Checks that the socket directory can be trusted: a real directory, not a symlink,
+    owned by the current user and not accessible by anyone else.
+    The directory is in a shared temporary folder, so another user could have created it first.
+
+    :raises OSError: if the directory does not exist or can not be trusted
+    """
+    info = os.lstat(UNIX_SOCKET_DIR)
+    if not stat.S_ISDIR(info.st_mode):
+        raise OSError(errno.ENOTDIR, 'Not a directory', UNIX_SOCKET_DIR)
+    if info.st_uid != os.getuid() or info.st_mode & 0o077 != 0:
+        raise OSError(errno.EPERM, 'Insecure socket directory, it must be private to the current user', UNIX_SOCKET_DIR)
+
+def create_endpoint_dir():
+    """
+    Creates the directory that the daemons bind their sockets in, readable only by the current user.
+
+    :raises OSError: if the directory could not be created, or an existing one can not be trusted
+    """
+    try:
+        os.makedirs(UNIX_SOCKET_DIR, 0o700)
+    except FileExistsError:
+        pass
+
+    check_endpoint_dir()
+
+def is_process_alive(pid):
+    """
+    Checks if a process is running, without sending it a signal.
+
+    :param pid int: the process ID
+    :rType: bool
+    """
+    try:
+        os.kill(pid, 0)
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+
+    return True
+
+def remove_endpoint(path):
+    """
+    Removes the socket of a daemon that is no longer running.
+
+    :param path str: the path to the socket
+    """
+    try:
+        os.remove(path)
+        logging.debug('Removed stale daemon socket: %s', path)
+    except OSError:
+        pass
+
+def get_endpoints():
+    """
+    Gets the sockets of the running daemons. Sockets left behind by daemons
+    that are no longer running are removed, based on the process ID in their name.
+    Nothing is returned if the socket directory can not be trusted, see check_endpoint_dir.
+
+    :return: the paths to the sockets
+    :rType: list
+    """
+    try:
+        check_endpoint_dir()
+        filenames = os.listdir(UNIX_SOCKET_DIR)
+    except OSError:
+        return []
+
+    endpoints = []
+    for filename in filenames:
+        if not filename.startswith(ENDPOINT_PREFIX):
+            continue
+
+        try:
+            pid = int(filename[len(ENDPOINT_PREFIX):])
+        except ValueError:
+            continue
+
+        path = os.path.join(UNIX_SOCKET_DIR, filename)
+        if is_process_alive(pid):
+            endpoints.append(path)
+        else:
+            remove_endpoint(path)
+
+    return endpoints
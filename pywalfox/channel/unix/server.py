@@ -1,36 +1,22 @@
 import os
-import socket
 import logging
-from ..connector import Connector
+from ..connector import ConnectionServer
+from .endpoints import create_endpoint_dir, get_endpoints
 
 
-class Server(Connector):
-    """UNIX-socket server used to communicate with clients."""
+class Server(ConnectionServer):
+    """
+    UNIX-socket server used to communicate with clients.
+    Every daemon binds its own socket, so that several daemons can run at the same time.
+    """
     def __init__(self):
-        Connector.__init__(self, 'unix')
-
-    def is_socket_in_use(self):
-        """Check if the socket is actively in use by another process."""
-        if not os.path.exists(self.host):
-            return False
-
-        test_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
-        try:
-            test_socket.connect(self.host)
-            return True
-        except (socket.error, OSError):
-            return False
-        finally:
-            test_socket.close()
+        ConnectionServer.__init__(self, 'unix')
 
     def delete_existing_socket(self):
-        """Deletes the existing UNIX-socket if it exists and is stale."""
+        """Deletes the sockets of daemons that are no longer running, including a leftover socket at our own path."""
+        get_endpoints()
         if os.path.exists(self.host):
-            if self.is_socket_in_use():
-                logging.error('Another daemon is already running')
-                return False
             os.remove(self.host)
-        return True
 
     def start(self):
         """
@@ -39,27 +25,23 @@ class Server(Connector):
         :return: if the socket could be bound to the file
         :rType: bool
         """
-        if not self.delete_existing_socket():
-            return False
         try:
+            create_endpoint_dir()
+            self.delete_existing_socket()
             self.socket.bind(self.host)
-            logging.debug('Successfully bound socket to: %s' % self.host)
+            self.listen()
+            logging.debug('Successfully bound socket to: %s', self.host)
             return True
         except OSError as e:
-            logging.error('Failed to create UNIX socket: %s' % e.strerror)
+            logging.error('Failed to create UNIX socket: %s', e.strerror)
 
         return False
 
     def close(self):
-        """Unbinds the socket and deletes the file."""
-        self.socket.close()
+        """Closes the connections, unbinds the socket and deletes the file."""
+        ConnectionServer.close(self)
 
         try:
-            """
-            UNIX-sockets can be overwritten by other processes even if another process
-            is already using it. This may lead to the file not existing and will
-            cause a crash if not handled properly.
-            """
             os.remove(self.host)
             logging.debug('UNIX-socket deleted')
         except OSError as e:
@@ -1,24 +1,34 @@
 import logging
 from ..connector import Connector
+from ...config import WIN_SOCKET_HOST, WIN_SOCKET_HOST_ALT
+
+def get_endpoints():
+    """
+    Gets the hosts that a daemon may be listening on.
+
+    :return: the hosts
+    :rType: list
+    """
+    return [WIN_SOCKET_HOST, WIN_SOCKET_HOST_ALT]
 
 
 class Client(Connector):
-    """UDP-socket client used to communicate with the daemon."""
+    """TCP-socket client used to communicate with a daemon."""
     def __init__(self):
         Connector.__init__(self, 'win32', False)
 
     def connect(self, host):
         """
-        Connects to the UDP socket.
+        Connects to the TCP socket.
 
         :return: if the connection to the socket was successfull
         :rType: bool
         """
         try:
             self.socket.connect(host)
-            logging.debug('Successfully connected to UDP socket at: %s:%s' % (host[0], host[1]))
+            logging.debug('Successfully connected to TCP socket at: %s:%s', host[0], host[1])
             return True
         except Exception as e:
-            logging.debug('Failed to connect to socket: %s' % str(e))
+            logging.debug('Failed to connect to socket: %s', str(e))
 
         return False
@@ -1,11 +1,11 @@
 import logging
-from ..connector import Connector
+from ..connector import ConnectionServer
 
 
-class Server(Connector):
-    """UDP-socket server used to communicate with clients."""
+class Server(ConnectionServer):
+    """TCP-socket server used to communicate with clients."""
     def __init__(self):
-        Connector.__init__(self, 'win32')
+        ConnectionServer.__init__(self, 'win32')
 
     def start(self):
         """
@@ -16,9 +16,10 @@ class Server(Connector):
         """
         try:
             self.socket.bind(self.host)
-            logging.debug('Successfully bound socket to: %s:%s' % (self.host[0], self.host[1]))
+            self.listen()
+            logging.debug('Successfully bound socket to: %s:%s', self.host[0], self.host[1])
             return True
         except OSError as e:
-            logging.error('Failed to setup UDP socket server: %s' % e.strerror)
+            logging.error('Failed to setup TCP socket server: %s', e.strerror)
 
         return False
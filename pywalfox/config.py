@@ -1,15 +1,41 @@
 import os
 import sys
-import tempfile
 
 DAEMON_VERSION = '2.9.0'
+EXTENSION_ID = 'pywalfox@frewacom.org'
+
+def get_temp_dir():
+    """
+    Gets the directory for temporary files, in the same order of precedence
+    as tempfile.gettempdir, without importing the tempfile module at startup.
+
+    :return: the path to the temporary directory
+    :rType: str
+    """
+    for name in ('TMPDIR', 'TEMP', 'TMP'):
+        path = os.getenv(name)
+        if path and os.path.isdir(path):
+            return os.path.abspath(path)
+
+    for path in ('/tmp', '/var/tmp', '/usr/tmp'):
+        if os.path.isdir(path):
+            return path
+
+    return os.getcwd()
 
 if sys.platform.startswith('win32'):
+    UNIX_SOCKET_DIR = None
     UNIX_SOCKET_PATH = None
 else:
-    UNIX_SOCKET_PATH = os.path.join(tempfile.gettempdir(), 'pywalfox_socket_%d' % os.getuid())
+    # Every running daemon binds its own socket in this directory, named after its process ID
+    UNIX_SOCKET_DIR = os.path.join(get_temp_dir(), 'pywalfox_%d' % os.getuid())
+    UNIX_SOCKET_PATH = os.path.join(UNIX_SOCKET_DIR, 'daemon_%d')
 WIN_SOCKET_HOST = ('127.0.0.1', 56744)
 WIN_SOCKET_HOST_ALT = ('127.0.0.1', 56745)
+SOCKET_BUFFER_SIZE = 4096 # initial size of the receive buffer of a socket connection
+SOCKET_MAX_FRAME_SIZE = 1024*1024 # 1 mb, larger messages are rejected
+SOCKET_MAX_CONNECTIONS = 16
+CLIENT_ACK_TIMEOUT = 1.0 # seconds
 
 HOME_PATH = os.path.expanduser('~')
 XDG_CACHE_DIR = os.getenv('XDG_CACHE_HOME', os.path.join(HOME_PATH, '.cache'))
@@ -28,11 +54,70 @@ FIREFOX_PROFILES_PATH_LINUX_XDG = os.path.join(XDG_CONFIG_DIR, 'firefox')
 FIREFOX_PROFILES_PATH_WIN = os.path.join(HOME_PATH, 'AppData/Roaming/Mozilla/Firefox')
 FIREFOX_PROFILES_PATH_DARWIN = os.path.join(HOME_PATH, 'Library/Application Support/Firefox')
 
+# Profile folders of Firefox and its forks, in order of preference
+FIREFOX_PROFILES_PATHS_LINUX = [
+    FIREFOX_PROFILES_PATH_LINUX_XDG,
+    FIREFOX_PROFILES_PATH_LINUX,
+    os.path.join(HOME_PATH, '.var/app/org.mozilla.firefox/.mozilla/firefox'),
+    os.path.join(XDG_CONFIG_DIR, 'librewolf/librewolf'),
+    os.path.join(HOME_PATH, '.librewolf'),
+    os.path.join(HOME_PATH, '.floorp'),
+    os.path.join(HOME_PATH, '.waterfox'),
+]
+FIREFOX_PROFILES_PATHS_WIN = [
+    FIREFOX_PROFILES_PATH_WIN,
+    os.path.join(HOME_PATH, 'AppData/Roaming/librewolf'),
+    os.path.join(HOME_PATH, 'AppData/Roaming/Floorp'),
+    os.path.join(HOME_PATH, 'AppData/Roaming/Waterfox'),
+]
+FIREFOX_PROFILES_PATHS_DARWIN = [
+    FIREFOX_PROFILES_PATH_DARWIN,
+    os.path.join(HOME_PATH, 'Library/Application Support/librewolf'),
+    os.path.join(HOME_PATH, 'Library/Application Support/Floorp'),
+    os.path.join(HOME_PATH, 'Library/Application Support/Waterfox'),
+]
+CSS_PROFILE_WORKERS = 4 # threads used when applying custom CSS to several profiles
+
+# Custom CSS files that are re-rendered when the colors change, if 'css_palette' is enabled
+CSS_TEMPLATES = ['userChrome', 'userContent']
+
+# Variables in the custom CSS files that get a Pywal color baked in, {variable: color index}
+CSS_PALETTE_VARIABLES = {
+    '--pywalfox-background': 0,
+    '--pywalfox-background-light': 8,
+    '--pywalfox-accent': 1,
+    '--pywalfox-text': 15,
+    '--pywalfox-text-focus': 15,
+}
+PROFILE_INDEX_PATH = os.path.join(XDG_CACHE_DIR, 'pywalfox', 'profiles.json')
+
+# CPU profiles and allocation snapshots of the daemon, see profiler.py
+PROFILE_DIR = os.path.join(XDG_CACHE_DIR, 'pywalfox', 'profiling')
+PROFILE_TRACEMALLOC_FRAMES = 16 # frames stored per allocation traceback
+PROFILE_CLIENT_TIMEOUT = 5.0 # seconds `pywalfox profile` waits, including writing the profile
+
+# Derived themes sent with the colors, see theme.py.
+# {role: color index, or (color index, lightness to add from -1 to 1)}
+THEME_DARK = {
+    'background': 0,
+    'background_light': (0, 0.08),
+    'accent_primary': 1,
+    'accent_secondary': 2,
+}
+THEME_LIGHT = {
+    'background': (15, 0.1),
+    'background_light': 15,
+    'accent_primary': 1,
+    'accent_secondary': 2,
+}
+THEME_TEXT_CANDIDATES = [0, 7, 8, 15] # the color with the best contrast on the background is used as text
+
 LOG_FILE_COUNT = 1
 LOG_FILE_MAX_SIZE = 1000*200 # 0.2 mb
 LOG_FILE_DATE_FORMAT = '%m-%d-%Y %I:%M:%S'
 LOG_FILE_FORMAT = '[%(asctime)s] %(levelname)s:%(message)s'
 LOG_FILE_PATH = os.path.join(XDG_CACHE_DIR, 'pywalfox.log')
+LOG_RING_SIZE = 500 # recent records kept in memory, see `pywalfox logs`
 
 if sys.platform.startswith('win32'):
     PYWALFOX_CONFIG_DIR = os.path.join(os.getenv('APPDATA', os.path.join(HOME_PATH, 'AppData', 'Roaming')), 'pywalfox')
@@ -42,11 +127,30 @@ else:
     PYWALFOX_CONFIG_DIR = os.path.join(XDG_CONFIG_DIR, 'pywalfox')
 
 PYWALFOX_CONFIG_PATH = os.path.join(PYWALFOX_CONFIG_DIR, 'config.json')
+SETTINGS_FLUSH_DELAY = 0.5 # seconds to wait before writing changed settings
+
+WATCHER_SETTLE_DELAY = 0.1 # seconds without new writes before a change is pushed
+WATCHER_SETTLE_MAX_WAIT = 1.0
+WATCHER_POLL_INTERVAL_MIN = 0.5
+WATCHER_POLL_INTERVAL_MAX = 5.0
+WATCHER_NETWORK_FILESYSTEMS = ['nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'fuse.sshfs', '9p']
+
+COMMANDS_COALESCE_WINDOW = 0.01 # seconds to wait for more CLI commands before handling them
+COLORS_DEBOUNCE_DELAY = 0.05 # seconds, used by the asyncio runtime to merge repeated updates
+STATS_LATENCY_BUCKETS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000, 100000] # microseconds
+COLORS_DELTA_MAX_CHANGES = 8 # send the full colorscheme if more colors than this have changed
+ACTION_WORKERS = 4 # threads that run the message actions that are not handled inline, see registry.py
+ACTION_QUEUE_SIZE = 64 # actions that can be queued or running on the pool, more are rejected
+ACTION_SHUTDOWN_TIMEOUT = 2.0 # seconds to wait for running actions when the daemon stops
+
+WRITER_QUEUE_SIZE = 256
+WRITER_FLUSH_TIMEOUT = 1.0
 
 ACTIONS = {
     'VERSION': 'debug:version',
     'OUTPUT': 'debug:output',
     'COLORS': 'action:colors',
+    'COLORS_DELTA': 'action:colors:delta',
     'INVALID_ACTION': 'action:invalid',
     'CSS_ENABLE': 'css:enable',
     'CSS_DISABLE': 'css:disable',
@@ -59,4 +163,14 @@ COMMANDS = {
     'THEME_MODE_LIGHT': 'theme:mode:light',
     'THEME_MODE_AUTO': 'theme:mode:auto',
     'UPDATE': 'action:update',
+    'SET_COLORS': 'action:colors:set',
+    'STATS': 'action:stats',
+    'PROFILE': 'action:profile',
+    'LOGS': 'action:logs',
 }
+
+# Pending outbound messages with these actions are replaced by newer ones
+COLLAPSIBLE_ACTIONS = [
+    ACTIONS['COLORS'],
+    ACTIONS['THEME_MODE'],
+]
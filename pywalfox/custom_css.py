@@ -1,108 +1,270 @@
 import os
-import sys
-import shutil
+import re
+import hashlib
 import logging
-import fileinput
-from .config import CSS_PATH, FIREFOX_PROFILES_PATH_WIN, FIREFOX_PROFILES_PATH_DARWIN, FIREFOX_PROFILES_PATH_LINUX, FIREFOX_PROFILES_PATH_LINUX_XDG
-
-try:
-    import configparser
-except ImportError: # python 2.7.x
-    import ConfigParser as configparser
-
-
-_profile_path_override = None
-
-def set_profile_path_override(path):
-    """Sets a custom Firefox profile path, overriding OS-specific defaults."""
-    global _profile_path_override
-    _profile_path_override = path
-
-def get_firefox_profiles_path():
-    """Gets the correct Firefox profiles folder based on the current OS."""
-    if _profile_path_override is not None:
-        return _profile_path_override
-    if sys.platform.startswith('win32'):
-        return FIREFOX_PROFILES_PATH_WIN
-    elif sys.platform.startswith('darwin'):
-        return FIREFOX_PROFILES_PATH_DARWIN
-    else:
-        # Newer Firefox versions may use XDG_CONFIG_HOME (~/.config/firefox)
-        if os.path.isfile(os.path.join(FIREFOX_PROFILES_PATH_LINUX_XDG, 'profiles.ini')):
-            return FIREFOX_PROFILES_PATH_LINUX_XDG
-        return FIREFOX_PROFILES_PATH_LINUX
-
-def get_profile_from_ini():
-    """
-    Reads the default profile name for the current Firefox installation
-    from profiles.ini and returns the absolute path to the profile.
-
-    :return: path to the current profile folder
-    :rType: str
+from .config import CSS_PATH, CSS_PROFILE_WORKERS, CSS_PALETTE_VARIABLES
+from .profiles import get_active_profile_path, get_profiles
+from .theme import get_palette_hash
+from .utils.fs import get_file_signature, atomic_write
+
+FONT_SIZE_PATTERN = re.compile(br'^([ \t]*--pywalfox-font-size:)([^;\n]*);', re.MULTILINE)
+VARIABLE_PATTERN = re.compile(br'^([ \t]*(--pywalfox-[a-z-]+):)[^;\n]*;', re.MULTILINE)
+
+_executor = None
+
+# {path: (signature, digest, contents)} of the shipped and installed CSS files, see get_indexed_file
+_css_index = {}
+
+# {installed path: (source key, digest of the installed file)} of up to date installed files
+_installed_from = {}
+
+# {digest of a shipped file: parsed template}, see parse_template
+_templates = {}
+
+# {filename: ((template digest, palette hash), rendered contents)}
+_rendered = {}
+
+def get_indexed_file(path):
     """
-    firefox_profiles_path = get_firefox_profiles_path()
-    ini_path = os.path.join(firefox_profiles_path, 'profiles.ini')
-    if not os.path.exists(ini_path):
-        logging.error('Could not find profiles.ini in Firefox profiles folder')
-        return False
+    Gets the contents and content hash of a CSS file, only reading the file
+    if its stat signature changed since it was last indexed.
 
-    profile = configparser.ConfigParser()
-    profile.read(ini_path)
+    :param path str: the path to the CSS file
+    :return: (signature, digest, contents), or None if the file does not exist
+    :rType: tuple
+    """
+    signature = get_file_signature(path)
+    if signature is None:
+        _css_index.pop(path, None)
+        return None
 
-    section_name = 'Profile0'
-    path_value = profile.get(section_name, 'Path')
-    relative_value = profile.get(section_name, 'IsRelative')
+    entry = _css_index.get(path)
+    if entry is None or entry[0] != signature:
+        with open(path, 'rb') as f:
+            data = f.read()
 
-    if relative_value == '1':
-        profile_path = os.path.normpath(os.path.join(firefox_profiles_path, path_value))
-        logging.debug('Firefox profile path is relative')
-    else:
-        profile_path = os.path.normpath(path_value)
-        logging.debug('Firefox profile path is absolute')
+        entry = (signature, hashlib.sha1(data).digest(), data)
+        _css_index[path] = entry
 
-    if not os.path.exists(profile_path):
-        logging.error('The profile path retrieved from profiles.ini does not exist: %s' % profile_path)
-        return False
+    return entry
 
-    return profile_path
+def write_indexed_file(path, data):
+    """
+    Atomically writes a CSS file and adds the new contents to the index.
+
+    :param path str: the path to the CSS file
+    :param data bytes: the new contents
+    :return: (signature, digest, contents)
+    :rType: tuple
+    """
+    atomic_write(path, data)
+    entry = (get_file_signature(path), hashlib.sha1(data).digest(), data)
+    _css_index[path] = entry
+    return entry
 
 def get_firefox_chrome_path():
     """
-    Retrieves the path to the 'chrome' folder in the default Firefox profile
+    Retrieves the path to the 'chrome' folder in the active Firefox profile
 
     :return: the absolute path to the chrome folder
     :rType: str
     """
-    profile_path = get_profile_from_ini()
+    profile_path = get_active_profile_path()
 
     if not profile_path:
         return False
 
+    return get_chrome_path(profile_path)
+
+def get_chrome_path(profile_path):
+    """
+    Gets the path to the 'chrome' folder in a profile, creating it if needed.
+
+    :param profile_path str: the path to the profile
+    :return: the absolute path to the chrome folder
+    :rType: str
+    """
     chrome_path = os.path.join(profile_path, 'chrome')
     if not os.path.exists(chrome_path):
         logging.debug('Creating non-existant chrome directory')
         os.makedirs(chrome_path)
 
-    logging.debug('Found chrome directory at path: %s' % chrome_path)
+    logging.debug('Found chrome directory at path: %s', chrome_path)
     return chrome_path
 
-def enable_custom_css(chrome_path, name):
+def get_selected_chrome_paths(selection):
+    """
+    Gets the 'chrome' folders of a set of profiles.
+
+    :param selection [str|list]: 'all', or a list of profile names and/or profile paths
+    :return: the chrome folders of the existing profiles that were selected
+    :rType: list
+    """
+    if isinstance(selection, str) and selection != 'all':
+        selection = [selection]
+
+    chrome_paths = []
+    for profile in get_profiles():
+        if selection == 'all' or profile['name'] in selection or profile['path'] in selection:
+            if os.path.isdir(profile['path']):
+                chrome_path = get_chrome_path(profile['path'])
+                if chrome_path not in chrome_paths:
+                    chrome_paths.append(chrome_path)
+            else:
+                logging.debug('Skipping profile that does not exist: %s', profile['path'])
+
+    # Paths to profiles that are not listed in any profiles.ini
+    if selection != 'all':
+        for path in selection:
+            if os.path.isabs(path) and os.path.isdir(path):
+                chrome_path = get_chrome_path(path)
+                if chrome_path not in chrome_paths:
+                    chrome_paths.append(chrome_path)
+
+    return chrome_paths
+
+def apply_to_chrome_paths(chrome_paths, function, *args):
+    """
+    Calls a custom CSS function, e.g. enable_custom_css, for several chrome folders.
+    When there are several folders, the calls are made in parallel on a small thread pool.
+
+    :param chrome_paths list: the chrome folders
+    :param function function: called with a chrome folder and args, returns (success, message)
+    :return: a list of (chrome folder, success, message), in the same order as chrome_paths
+    :rType: list
+    """
+    global _executor
+
+    if len(chrome_paths) <= 1:
+        return [(chrome_path,) + function(chrome_path, *args) for chrome_path in chrome_paths]
+
+    if _executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _executor = ThreadPoolExecutor(max_workers=CSS_PROFILE_WORKERS, thread_name_prefix='pywalfox-css')
+
+    futures = [_executor.submit(function, chrome_path, *args) for chrome_path in chrome_paths]
+    return [(chrome_path,) + future.result() for (chrome_path, future) in zip(chrome_paths, futures)]
+
+def parse_template(data):
+    """
+    Splits a custom CSS file into static parts and the variables that get a Pywal color.
+
+    :param data bytes: the contents of the shipped CSS file
+    :return: a list of bytes and {'prefix', 'index'} for the palette variables
+    :rType: list
+    """
+    parts = []
+    position = 0
+    for match in VARIABLE_PATTERN.finditer(data):
+        name = match.group(2).decode('ascii')
+        if name in CSS_PALETTE_VARIABLES:
+            parts.append(data[position:match.start()])
+            parts.append({'prefix': match.group(1), 'index': CSS_PALETTE_VARIABLES[name]})
+            position = match.end()
+
+    parts.append(data[position:])
+    return parts
+
+def render_css(filename, colors):
+    """
+    Renders a shipped CSS file with the palette variables set to Pywal colors.
+    The template is parsed once, and only re-rendered when the palette or the shipped file changes.
+
+    :param filename str: the name of the shipped CSS file
+    :param colors list: the Pywal colors
+    :return: (render key, rendered contents)
+    :rType: tuple
+    """
+    path = os.path.join(CSS_PATH, filename)
+    source = get_indexed_file(path)
+    if source is None:
+        raise IOError('No such file: %s' % path)
+
+    key = (source[1], get_palette_hash(colors))
+    rendered = _rendered.get(filename)
+    if rendered is not None and rendered[0] == key:
+        return rendered
+
+    template = _templates.get(source[1])
+    if template is None:
+        template = parse_template(source[2])
+        _templates[source[1]] = template
+
+    data = b''.join(part if isinstance(part, bytes) else
+                    part['prefix'] + (' %s;' % colors[part['index']]).encode('utf-8')
+                    for part in template)
+
+    logging.debug('Rendered %s with palette %s', filename, key[1])
+    rendered = (key, data)
+    _rendered[filename] = rendered
+    return rendered
+
+def update_css_palette(chrome_path, name, colors):
+    """
+    Re-renders a custom CSS file in a chrome folder with new Pywal colors, if it is enabled.
+
+    :param chrome_path str: the path to the chrome directory
+    :param name str: the name of the css file, see CSS_TEMPLATES
+    :param colors list: the Pywal colors
+    :return: (success, message)
+    :rType: tuple
+    """
+    filename = add_css_file_extension(name)
+    if not os.path.isfile(os.path.join(chrome_path, filename)):
+        return (True, 'Custom CSS: %s is not enabled' % filename)
+
+    (success, message) = enable_custom_css(chrome_path, name, colors)
+    if not success:
+        return (False, message)
+
+    return (True, 'Custom CSS: rendered %s with the current colors' % filename)
+
+def enable_custom_css(chrome_path, name, colors=None):
     """
     Applies a CSS file but putting it in the 'chrome' directory.
+    The font size set in an already installed copy is kept, and the file is
+    not rewritten if the installed copy is already up to date.
 
     :param chrome_path str: the path to the chrome directory
     :param name str: the name of the css file to apply
+    :param colors list: Pywal colors to bake into the file, see render_css
     :return: (success, message)
     :rType: tuple
     """
     filename = add_css_file_extension(name)
-    logging.debug('Enabling custom CSS file: %s' % filename)
+    logging.debug('Enabling custom CSS file: %s', filename)
     try:
-        shutil.copy(os.path.join(CSS_PATH, filename), os.path.join(chrome_path, filename))
-        logging.debug('%s was enabled' % filename)
+        target_path = os.path.join(chrome_path, filename)
+        if colors is not None:
+            (source_key, data) = render_css(filename, colors)
+        else:
+            source = get_indexed_file(os.path.join(CSS_PATH, filename))
+            if source is None:
+                raise IOError('No such file: %s' % os.path.join(CSS_PATH, filename))
+
+            (source_key, data) = (source[1], source[2])
+
+        target = get_indexed_file(target_path)
+        if target is not None and _installed_from.get(target_path) == (source_key, target[1]):
+            logging.debug('%s is already up to date', filename)
+            return (True, 'Custom CSS: %s has been enabled' % filename)
+
+        if target is not None:
+            # Keep the values the user has set in the installed copy
+            match = FONT_SIZE_PATTERN.search(target[2])
+            if match is not None:
+                data = FONT_SIZE_PATTERN.sub(lambda m: m.group(1) + match.group(2) + b';', data)
+
+        if target is None or target[1] != hashlib.sha1(data).digest():
+            target = write_indexed_file(target_path, data)
+            logging.debug('%s was enabled', filename)
+        else:
+            logging.debug('%s is already up to date', filename)
+
+        _installed_from[target_path] = (source_key, target[1])
         return (True, 'Custom CSS: %s has been enabled' % filename)
     except Exception as e:
-        logging.error('%s could not be enabled: %s' % (filename, str(e)))
+        logging.error('%s could not be enabled: %s', filename, str(e))
         return (False, 'Could not copy custom CSS to folder: %s' % str(e))
 
 def disable_custom_css(chrome_path, name):
@@ -115,14 +277,16 @@ def disable_custom_css(chrome_path, name):
     :rType: tuple
     """
     filename = add_css_file_extension(name)
-    logging.debug('Disabling custom CSS file: %s' % filename)
+    logging.debug('Disabling custom CSS file: %s', filename)
     try:
         if os.path.isfile(os.path.join(chrome_path, filename)):
             os.remove(os.path.join(chrome_path, filename))
-            logging.debug('%s was disabled' % filename)
+            _css_index.pop(os.path.join(chrome_path, filename), None)
+            _installed_from.pop(os.path.join(chrome_path, filename), None)
+            logging.debug('%s was disabled', filename)
         return (True, 'Custom CSS: %s has been disabled' % filename)
     except Exception as e:
-        logging.error('%s could not be disabled: %s' % (filename, str(e)))
+        logging.error('%s could not be disabled: %s', filename, str(e))
         return (False, 'Could not remove custom CSS: %s' % str(e))
 
 def set_font_size(chrome_path, name, size):
@@ -136,13 +300,20 @@ def set_font_size(chrome_path, name, size):
     :rType: tuple
     """
     filename = add_css_file_extension(name)
-    logging.debug('Setting font size to %s in custom CSS file: %s' % (size, filename))
+    logging.debug('Setting font size to %s in custom CSS file: %s', size, filename)
     try:
-        for line in fileinput.input(os.path.join(chrome_path, filename), inplace=True):
-            if '--pywalfox-font-size:' in line:
-                print('  --pywalfox-font-size: %spx;' % size)
-            else:
-                print(line, end='')
+        path = os.path.join(chrome_path, filename)
+        entry = get_indexed_file(path)
+        if entry is None:
+            raise IOError('No such file: %s' % path)
+
+        value = (' %spx;' % size).encode('utf-8')
+        data = FONT_SIZE_PATTERN.sub(lambda match: match.group(1) + value, entry[2])
+        if data != entry[2]:
+            write_indexed_file(path, data)
+        else:
+            logging.debug('Font size in %s is already %s', filename, size)
+
         return (True, 'Font size was set to: %s' % size)
     except Exception as e:
         error_msg = 'Could not set font size: %s' % str(e)
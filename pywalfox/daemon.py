@@ -1,14 +1,25 @@
+import os
 import sys
+import json
+import signal
 import logging
+import threading
 from threading import Thread
 
-from .fetcher import get_pywal_colors
-from .custom_css import get_firefox_chrome_path, enable_custom_css, set_font_size, disable_custom_css
+from .fetcher import get_pywal_colors, parse_pywal_colors, get_cache_stats
+from .theme import get_theme, get_scheme_version
+from .watcher import ColorsWatcher
+from .custom_css import get_firefox_chrome_path, get_selected_chrome_paths, apply_to_chrome_paths, enable_custom_css, set_font_size, disable_custom_css, update_css_palette
 
-from .config import DAEMON_VERSION, ACTIONS, COMMANDS
+from .config import DAEMON_VERSION, ACTIONS, COMMANDS, PYWAL_COLORS_PATH, CSS_TEMPLATES, COMMANDS_COALESCE_WINDOW, COLORS_DELTA_MAX_CHANGES, ACTION_WORKERS, ACTION_QUEUE_SIZE, ACTION_SHUTDOWN_TIMEOUT
+from . import stats
+from . import profiler
 from .response import Message
+from .executor import ActionExecutor
+from .registry import INLINE, SERIAL, register_action, register_command, get_action, get_command, get_command_name
 from .messenger import Messenger
 from .settings import get_setting, save_settings
+from .utils.logger import get_recent_records
 
 if sys.platform.startswith('win32'):
     from .channel.win.server import Server
@@ -27,23 +38,72 @@ class Daemon:
         self.set_chrome_path()
         self.messenger = Messenger(self.python_version)
         self.socket_server = Server()
+        self.colors_watcher = None
+        self.merged_commands = 0
+        self.send_derived_theme = False
+        self.send_versioned_colors = False
+        # The colorscheme version last sent to the extension, see push_pywal_colors.
+        # The colors are sent from the message, socket and watcher threads.
+        self.colors_lock = threading.Lock()
+        self.sent_colors = None
+        self.sent_delta = None
+        self.suppressed_colors = 0
+        self.colors_override = None
+        stats.set_enabled(get_setting('stats', True) is not False)
+        self.profile_signal_installed = False
+        self.profile_signaled = threading.Event()
+        self.actions = ActionExecutor(ACTION_WORKERS, ACTION_QUEUE_SIZE)
+        self.load_action_modules()
         self.is_running = False
         self.persisted_state_sent = False
 
+    def load_action_modules(self):
+        """
+        Imports the modules listed in the 'action_modules' setting, which can
+        register their own actions and commands, see registry.py.
+        """
+        import importlib
+
+        for name in get_setting('action_modules', []):
+            try:
+                importlib.import_module(name)
+                logging.debug('Loaded action module: %s', name)
+            except Exception as e:
+                logging.error('Could not load action module %s: %s', name, str(e))
+
     def set_chrome_path(self):
         """Tries to set the path to the chrome directory."""
         self.chrome_path = get_firefox_chrome_path()
 
-    def check_chrome_path(self, action, target):
+    def get_chrome_paths(self, message):
+        """
+        Gets the chrome folders that a CSS action should be applied to.
+
+        A message can select profiles with a 'profiles' key, otherwise the 'css_profiles'
+        setting is used. Both take 'all' or a list of profile names or paths. Without a
+        selection, only the chrome folder of the active profile is used.
+
+        :param message object: the decoded message
+        :return: the chrome folders
+        :rType: list
+        """
+        selection = message.get('profiles', get_setting('css_profiles'))
+        if not selection:
+            return [self.chrome_path] if self.chrome_path else []
+
+        return get_selected_chrome_paths(selection)
+
+    def check_chrome_path(self, action, target, chrome_paths):
         """
         Checks if the path to the 'chrome' directory was found and sends a message if it was not.
 
         :param action str: the message action
         :param target str: the target CSS file
-        :return: if chrome_path is set
+        :param chrome_paths list: the chrome folders to apply the action to
+        :return: if there is at least one chrome folder
         :rType: bool
         """
-        if not self.chrome_path:
+        if not chrome_paths:
             self.messenger.send_message(Message(
                 action,
                 data=target,
@@ -54,6 +114,42 @@ class Daemon:
 
         return True
 
+    def send_css_response(self, action, data, chrome_paths, function, *args):
+        """
+        Applies a custom CSS function to the chrome folders and sends the result to the extension.
+        When applied to several folders, the result of each is included in 'details'.
+
+        :param action str: the message action
+        :param data any: the data to send along with the response
+        :param chrome_paths list: the chrome folders
+        :param function function: the custom CSS function, called with a chrome folder and args
+        """
+        results = apply_to_chrome_paths(chrome_paths, function, *args)
+        if len(results) == 1:
+            (_, success, message) = results[0]
+            details = None
+        else:
+            success = all(result[1] for result in results)
+            failed = [result for result in results if not result[1]]
+            if failed:
+                message = '%d of %d profiles failed: %s' % (len(failed), len(results), failed[0][2])
+            else:
+                message = '%s (%d profiles)' % (results[0][2], len(results))
+
+            details = [{
+                'path': chrome_path,
+                'success': result_success,
+                'message': result_message,
+            } for (chrome_path, result_success, result_message) in results]
+
+        self.messenger.send_message(Message(
+            action,
+            data=data,
+            success=success,
+            message=message,
+            details=details,
+        ))
+
     def check_target(self, message):
         """
         Checks if the message received specifies a target, or the message is invalid.
@@ -65,23 +161,192 @@ class Daemon:
         if 'target' in message and len(message['target']) > 0:
             return message['target']
 
-        logging.error('%s: target was not specified' % message['action'])
+        logging.error('%s: target was not specified', message['action'])
         self.send_invalid_action()
         return False
 
     def send_version(self):
         """Sends the current daemon version to the extension."""
-        self.messenger.send_message(Message(ACTIONS['VERSION'], data=DAEMON_VERSION))
+        self.messenger.send_message(
+            Message(ACTIONS['VERSION'], data=DAEMON_VERSION),
+            cache_key=ACTIONS['VERSION'],
+            cache_token=DAEMON_VERSION,
+        )
+
+    def get_colors(self):
+        """
+        Gets the current colorscheme: a palette pushed through the socket server
+        if there is one, otherwise the colors in the Pywal cache file.
+
+        :return: (success, {'colors', 'wallpaper'}, error message)
+        :rType: tuple
+        """
+        if self.colors_override is not None:
+            return self.colors_override
+
+        return get_pywal_colors()
+
+    def set_colors_override(self, palette):
+        """
+        Validates a palette pushed through the socket server and sends it to the extension.
+        The palette is used instead of the Pywal cache file until the file changes
+        or 'pywalfox update' is run without a palette.
+
+        :param palette dict: the palette, in the format of the Pywal cache file
+        :return: an error message if the palette is invalid
+        :rType: str
+        """
+        result = parse_pywal_colors(palette, 'The palette', require_wallpaper=False, check_format=True)
+        if result[0] is not True:
+            return result[2]
+
+        self.colors_override = result
+        self.push_pywal_colors()
+        return None
+
+    def clear_colors_override(self):
+        """Goes back to using the Pywal cache file, if a palette was pushed."""
+        if self.colors_override is not None:
+            logging.debug('Dropping the pushed palette')
+            self.colors_override = None
 
     def send_pywal_colors(self):
-        """Sends the current colorscheme to the extension."""
-        (success, pywal_data, message) = get_pywal_colors()
+        """
+        Sends the current colorscheme to the extension, along with the derived
+        theme if the extension has asked for it (see theme.get_theme), and the
+        version of the colorscheme if the extension accepts delta updates.
+        """
+        with self.colors_lock:
+            self.send_colors_locked()
+
+    def send_colors_locked(self):
+        """Sends the current colorscheme, see send_pywal_colors. Must be called with colors_lock held."""
+        result = self.get_colors()
+        (success, pywal_data, message) = result
+        cache_key = ACTIONS['COLORS']
+
+        if success is True and self.send_derived_theme is True:
+            pywal_data = dict(pywal_data, theme=get_theme(pywal_data['colors']))
+            cache_key = '%s:theme' % cache_key
+
+        if success is True and self.send_versioned_colors is True:
+            version = get_scheme_version(pywal_data)
+            self.sent_colors = (version, result[1])
+            pywal_data = dict(pywal_data, version=version)
+            cache_key = '%s:version' % cache_key
+        else:
+            self.sent_colors = None
+
+        # The fetcher returns the same result object until the colorscheme changes,
+        # which lets the messenger reuse the frame it encoded the last time.
         self.messenger.send_message(Message(
             ACTIONS['COLORS'],
             data=pywal_data,
             success=success,
             message=message,
-        ))
+        ), cache_key=cache_key, cache_token=result)
+
+        if success is True:
+            self.render_css_palette(pywal_data['colors'])
+
+    def push_pywal_colors(self):
+        """
+        Sends the colorscheme to the extension after it has changed, e.g. when the
+        colors file was updated or 'pywalfox update' was run.
+
+        If the extension accepts delta updates, nothing is sent when it already has the
+        current version, and only the changed colors are sent when a few of them changed.
+        Otherwise, or when the colors could not be read, the full colorscheme is sent.
+        The full colorscheme is also sent while the last delta is still waiting to be written,
+        so that a stalled extension gets the latest colorscheme instead of a growing backlog.
+        """
+        with self.colors_lock:
+            self.push_colors_locked()
+
+    def push_colors_locked(self):
+        """Sends the colorscheme after it has changed, see push_pywal_colors. Must be called with colors_lock held."""
+        if self.send_versioned_colors is False or self.sent_colors is None:
+            self.send_colors_locked()
+            return
+
+        (success, pywal_data, _) = self.get_colors()
+        if success is not True:
+            self.send_colors_locked()
+            return
+
+        (sent_version, sent_data) = self.sent_colors
+        version = get_scheme_version(pywal_data)
+        if version == sent_version:
+            logging.debug('Colorscheme %s has already been sent', version)
+            self.suppressed_colors += 1
+            return
+
+        colors = pywal_data['colors']
+        changed = dict((str(index), color) for (index, (color, sent_color))
+                       in enumerate(zip(colors, sent_data['colors'])) if color != sent_color)
+
+        if len(colors) != len(sent_data['colors']) or len(changed) > COLORS_DELTA_MAX_CHANGES:
+            self.send_colors_locked()
+            return
+
+        if self.messenger.is_queued(self.sent_delta):
+            logging.debug('The last colors delta has not been written yet, sending the full colorscheme')
+            self.send_colors_locked()
+            return
+
+        data = {'base': sent_version, 'version': version, 'colors': changed}
+        if pywal_data['wallpaper'] != sent_data['wallpaper']:
+            data['wallpaper'] = pywal_data['wallpaper']
+        if changed and self.send_derived_theme is True:
+            data['theme'] = get_theme(colors)
+
+        logging.debug('Sending %d changed colors, version %s', len(changed), version)
+        self.sent_colors = (version, pywal_data)
+        self.sent_delta = self.messenger.send_message(Message(ACTIONS['COLORS_DELTA'], data=data))
+
+        if changed:
+            self.render_css_palette(colors)
+
+    def get_css_palette(self):
+        """
+        Gets the colors to bake into custom CSS files, if the 'css_palette' setting is enabled.
+
+        :return: the Pywal colors, or None if the CSS should use the theme variables
+        :rType: list
+        """
+        if get_setting('css_palette') is not True:
+            return None
+
+        (success, pywal_data, _) = self.get_colors()
+        return pywal_data['colors'] if success is True else None
+
+    def render_css_palette(self, colors):
+        """
+        Re-renders the enabled custom CSS files with new colors, if the 'css_palette' setting is enabled.
+
+        Each file is rendered on the action thread pool, in order with the css:* actions
+        for the same target. A queued render is superseded by a newer one.
+
+        :param colors list: the Pywal colors
+        """
+        if get_setting('css_palette') is not True:
+            return
+
+        for name in CSS_TEMPLATES:
+            if not self.actions.submit_serial(name, self.render_css_file, name, colors, supersede='palette'):
+                logging.error('Could not render custom CSS: too many pending actions')
+
+    def render_css_file(self, name, colors):
+        """
+        Re-renders a custom CSS file in the selected chrome folders, see render_css_palette.
+        Files are only rewritten when the palette has changed.
+
+        :param name str: the name of the css file
+        :param colors list: the Pywal colors
+        """
+        for (chrome_path, success, message) in apply_to_chrome_paths(self.get_chrome_paths({}), update_css_palette, name, colors):
+            if success is False:
+                logging.error('Could not render custom CSS in %s: %s', chrome_path, message)
 
     def send_invalid_action(self):
         """Sends an action to the extension indicating that the action sent was invalid"""
@@ -104,14 +369,9 @@ class Daemon:
         action = ACTIONS['CSS_ENABLE']
         target = self.check_target(message)
         if target is not False:
-            if self.check_chrome_path(action, target):
-                (success, message) = enable_custom_css(self.chrome_path, target)
-                self.messenger.send_message(Message(
-                    action,
-                    data=target,
-                    success=success,
-                    message=message,
-                ))
+            chrome_paths = self.get_chrome_paths(message)
+            if self.check_chrome_path(action, target, chrome_paths):
+                self.send_css_response(action, target, chrome_paths, enable_custom_css, target, self.get_css_palette())
 
     def send_disable_css_response(self, message):
         """
@@ -122,14 +382,9 @@ class Daemon:
         action = ACTIONS['CSS_DISABLE']
         target = self.check_target(message)
         if target is not False:
-            if self.check_chrome_path(action, target):
-                (success, message) = disable_custom_css(self.chrome_path, target)
-                self.messenger.send_message(Message(
-                    action,
-                    data=target,
-                    success=success,
-                    message=message,
-                ))
+            chrome_paths = self.get_chrome_paths(message)
+            if self.check_chrome_path(action, target, chrome_paths):
+                self.send_css_response(action, target, chrome_paths, disable_custom_css, target)
 
     def send_font_size_response(self, message):
         """
@@ -140,16 +395,11 @@ class Daemon:
         action = ACTIONS['CSS_FONT_SIZE']
         target = self.check_target(message)
         if target is not False:
-            if self.check_chrome_path(action, target):
+            chrome_paths = self.get_chrome_paths(message)
+            if self.check_chrome_path(action, target, chrome_paths):
                 if 'size' in message:
                     new_size = message['size']
-                    (success, message) = set_font_size(self.chrome_path, target, new_size)
-                    self.messenger.send_message(Message(
-                        action,
-                        data=new_size,
-                        success=success,
-                        message=message,
-                    ))
+                    self.send_css_response(action, new_size, chrome_paths, set_font_size, target, new_size)
 
     def send_theme_mode(self, mode):
         """
@@ -167,55 +417,257 @@ class Daemon:
         self.persisted_state_sent = True
         theme_mode = get_setting('theme_mode')
         if theme_mode is not None:
-            logging.debug('Applying persisted theme mode: %s' % theme_mode)
+            logging.debug('Applying persisted theme mode: %s', theme_mode)
             self.send_theme_mode(theme_mode)
 
+    def send_colors_response(self, message):
+        """
+        Sends the colors that the extension asked for, and the persisted state on first connect.
+
+        :param message object: the decoded message
+        """
+        if message.get('theme') is True:
+            # From now on, the derived theme is included whenever colors are sent
+            self.send_derived_theme = True
+        if message.get('delta') is True:
+            # Later updates only send what has changed, see push_pywal_colors
+            self.send_versioned_colors = True
+        self.send_pywal_colors()
+        if not self.persisted_state_sent:
+            self.send_persisted_state()
+
     def handle_message(self, message):
         """
-        Handles the incoming messages and does the appropriate action.
+        Looks up the handler of a message in the action registry and runs it
+        inline, on the action thread pool or after the earlier messages with the
+        same target, depending on the policy of the action (see registry.py).
+        When too many messages are pending on the pool, the message is rejected.
 
         :param message object: the decoded message
         """
         try:
-            action = message['action']
-            if action == ACTIONS['VERSION']:
-                self.send_version()
-            elif action == ACTIONS['COLORS']:
-                self.send_pywal_colors()
-                if not self.persisted_state_sent:
-                    self.send_persisted_state()
-            elif action == ACTIONS['CSS_ENABLE']:
-                self.send_enable_css_response(message)
-            elif action == ACTIONS['CSS_DISABLE']:
-                self.send_disable_css_response(message)
-            elif action == ACTIONS['CSS_FONT_SIZE']:
-                self.send_font_size_response(message)
-            else:
-                logging.debug('%s: no such action' % action)
-                self.send_invalid_action()
+            action = get_action(message['action'])
         except KeyError:
             logging.error('action was not defined')
             self.send_invalid_action()
+            return
+
+        if action is None:
+            logging.debug('%s: no such action', message['action'])
+            self.send_invalid_action()
+        elif action.policy == INLINE:
+            if profiler.is_profiling():
+                profiler.profile_call(self.run_action, (action, message))
+            else:
+                self.run_action(action, message)
+        else:
+            if action.policy == SERIAL:
+                supersede = action.name if action.supersede else None
+                submitted = self.actions.submit_serial(message.get('target'), self.run_action, action, message, supersede=supersede)
+            else:
+                submitted = self.actions.submit(self.run_action, action, message)
+
+            if not submitted:
+                logging.error('%s: too many pending actions, rejected the message', action.name)
+                self.messenger.send_message(Message(
+                    action.name,
+                    data=message.get('target'),
+                    success=False,
+                    message='Too many pending requests, try again later',
+                ))
+
+    def run_action(self, action, message):
+        """
+        Runs the handler of a message and records how long it takes.
+
+        :param action Action: the registered action
+        :param message object: the decoded message
+        """
+        start = stats.start_timer()
+        try:
+            action.handler(self, message)
+        except KeyError as e:
+            logging.error('%s: missing key in message: %s', action.name, str(e))
+            self.send_invalid_action()
+
+        if start is not None:
+            stats.stop_timer(action.stats_name, start)
+
+    def handle_command(self, message):
+        """
+        Handles a command received from the CLI through the socket server and records how long it takes.
+
+        :param message [str|dict]: the decoded command
+        :return: {'error'} if the command could not be handled, {'result'} if it returns data, or None
+        :rType: dict
+        """
+        name = get_command_name(message)
+        command = get_command(name)
+        if command is None:
+            logging.error('CLI: %s: no such command', name)
+            return {'error': '%s: no such command' % name}
+
+        logging.debug('CLI: %s', name)
+        start = stats.start_timer()
+        reply = profiler.profile_call(command.handler, (self, message))
+        if start is not None:
+            stats.stop_timer(command.stats_name, start)
+
+        return reply
+
+    def set_theme_mode(self, mode):
+        """
+        Saves and sends a new theme mode.
+
+        :param mode string: the new theme mode (dark/light/auto)
+        """
+        save_settings({'theme_mode': mode})
+        self.send_theme_mode(mode)
+
+    def update_pywal_colors(self):
+        """Sends the colors in the Pywal cache file, dropping a pushed palette."""
+        self.clear_colors_override()
+        self.push_pywal_colors()
+
+    def send_pushed_palette(self, command):
+        """
+        Sends a palette pushed with 'pywalfox update --stdin/--file'.
+
+        :param command dict: {'command', 'palette'}
+        :return: {'error'} if the palette is invalid
+        :rType: dict
+        """
+        error = self.set_colors_override(command.get('palette'))
+        return {'error': error} if error is not None else None
+
+    def coalesce_commands(self, messages):
+        """
+        Reduces a burst of commands to the minimal set with the same effect:
+        commands with the same merge key (see registry.py) are merged into the last one,
+        e.g. at most one colors update and only the last theme mode.
+        The commands that are kept are returned in the order of their last occurrence.
+
+        :param messages list: the decoded commands, in the order they were received
+        :return: the commands to handle
+        :rType: list
+        """
+        last_occurrence = {}
+        for index, message in enumerate(messages):
+            if message is None:
+                continue
+
+            command = get_command(message) if isinstance(message, str) else None
+            if command is None or command.merge is None:
+                effect = index # commands with arguments, queries and toggles are always kept
+            else:
+                effect = command.merge
+            last_occurrence[effect] = (index, message)
+
+        commands = [message for (_, message) in sorted(last_occurrence.values())]
+        merged = len(messages) - len(commands)
+        if merged > 0:
+            stats.increment('socket.merged_commands', merged)
+            self.merged_commands += merged
+            logging.debug('CLI: Merged %d commands (%d in total)', merged, self.merged_commands)
+
+        return commands
+
+    def get_coalesce_window(self):
+        """
+        Gets the number of seconds to wait for more commands after receiving one.
+
+        :return: the 'coalesce_window' setting in milliseconds converted to seconds, or the default
+        :rType: float
+        """
+        window = get_setting('coalesce_window')
+        if window is None:
+            return COMMANDS_COALESCE_WINDOW
+
+        return max(0, float(window) / 1000)
+
+    def parse_command_batch(self, message):
+        """
+        Parses a message received from the CLI. A message is either a single command,
+        or a JSON object with a list of commands and an id to acknowledge.
+        Commands are strings, or objects with a 'command' key and its arguments.
+
+        :param message str: the decoded message
+        :return: (list of commands, batch id or None)
+        :rType: tuple
+        """
+        if not message.startswith('{'):
+            return ([message], None)
+
+        try:
+            batch = json.loads(message)
+            commands = []
+            for command in batch['commands']:
+                if isinstance(command, dict):
+                    if not isinstance(command.get('command'), str):
+                        raise ValueError('command object without a command name')
+                    if len(command) == 1:
+                        command = command['command']
+                else:
+                    command = str(command)
+
+                commands.append(command)
+
+            return (commands, batch.get('id'))
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            logging.error('CLI: Received invalid command batch: %s', str(e))
+            return ([], None)
+
+    def process_commands(self, received):
+        """
+        Handles the commands in a list of messages received together, and acknowledges
+        each batch that asked for it once its commands have been handled. The
+        acknowledgement includes the errors and results of the commands in the batch, if any.
+
+        :param received list: a list of (decoded message, connection)
+        """
+        batches = []
+        commands = []
+        for (message, connection) in received:
+            if message is None:
+                continue
+
+            (batch_commands, batch_id) = self.parse_command_batch(message)
+            batches.append((batch_commands, batch_id, connection))
+            commands.extend(batch_commands)
+
+        stats.increment('socket.batches', len(batches))
+        stats.increment('socket.commands', len(commands))
+
+        replies = {}
+        for command in self.coalesce_commands(commands):
+            reply = self.handle_command(command)
+            if reply is not None:
+                replies[id(command)] = reply
+
+        for (batch_commands, batch_id, connection) in batches:
+            if batch_id is not None and connection is not None:
+                reply = {
+                    'id': batch_id,
+                    'received': len(batch_commands),
+                }
+                batch_replies = [replies[id(command)] for command in batch_commands if id(command) in replies]
+                if any('error' in batch_reply for batch_reply in batch_replies):
+                    reply['errors'] = [batch_reply['error'] for batch_reply in batch_replies if 'error' in batch_reply]
+                if any('result' in batch_reply for batch_reply in batch_replies):
+                    reply['results'] = [batch_reply['result'] for batch_reply in batch_replies if 'result' in batch_reply]
+
+                self.socket_server.send_reply(connection, json.dumps(reply))
 
     def socket_thread_worker(self):
         """The socket server thread worker."""
         while True:
-            message = self.socket_server.get_message()
-            if message == COMMANDS['UPDATE']:
-                logging.debug('CLI: Update pywal colors')
-                self.send_pywal_colors()
-            elif message == COMMANDS['THEME_MODE_DARK']:
-                logging.debug('CLI: Set theme mode to dark')
-                save_settings({'theme_mode': 'dark'})
-                self.send_theme_mode('dark')
-            elif message == COMMANDS['THEME_MODE_LIGHT']:
-                logging.debug('CLI: Set theme mode to light')
-                save_settings({'theme_mode': 'light'})
-                self.send_theme_mode('light')
-            elif message == COMMANDS['THEME_MODE_AUTO']:
-                logging.debug('CLI: Set theme mode to auto')
-                save_settings({'theme_mode': 'auto'})
-                self.send_theme_mode('auto')
+            received = self.socket_server.receive_messages()
+            if received is None:
+                logging.debug('Socket server was closed, stopping the socket thread')
+                return
+
+            received.extend(self.socket_server.get_pending_messages(self.get_coalesce_window()))
+            self.process_commands(received)
 
     def start_socket_server(self):
         """Starts the socket server and creates the socket thread."""
@@ -229,19 +681,127 @@ class Daemon:
 
             self.socket_thread.start()
 
+    def on_colors_changed(self):
+        """Called by the colors watcher when the Pywal colors file has been updated."""
+        logging.debug('Watcher: Update pywal colors')
+        self.clear_colors_override()
+        self.push_pywal_colors()
+
+    def get_stats(self):
+        """
+        Gets the statistics of the daemon, see stats.get_snapshot.
+
+        :return: the statistics
+        :rType: dict
+        """
+        snapshot = stats.get_snapshot()
+        snapshot['daemon'] = {
+            'pid': os.getpid(),
+            'version': DAEMON_VERSION,
+            'runtime': type(self).__name__,
+            'colors_suppressed': self.suppressed_colors,
+            'actions_pending': self.actions.pending,
+            'actions_superseded': self.actions.superseded,
+            'actions_rejected': self.actions.rejected,
+            'fetcher_cache': get_cache_stats(),
+        }
+        if self.messenger.writer is not None:
+            snapshot['daemon']['writer_collapsed'] = self.messenger.writer.collapsed
+            snapshot['daemon']['writer_dropped'] = self.messenger.writer.dropped
+
+        return snapshot
+
+    def toggle_profiling(self):
+        """
+        Starts profiling, or stops it and writes the profile, see profiler.py.
+
+        :return: {'result': {'pid', 'profiling', 'files'}}, or {'error'} if the profile could not be written
+        :rType: dict
+        """
+        if not profiler.is_profiling():
+            profiler.start_profiling()
+            return {'result': {'pid': os.getpid(), 'profiling': True, 'files': []}}
+
+        try:
+            files = profiler.stop_profiling()
+        except (IOError, OSError) as e:
+            logging.error('Could not write the profile: %s', str(e))
+            return {'error': 'could not write the profile: %s' % str(e)}
+
+        return {'result': {'pid': os.getpid(), 'profiling': False, 'files': files}}
+
+    def on_profile_signal(self, signum=None, frame=None):
+        """
+        Requests a profiling toggle when the daemon receives SIGUSR1.
+        The handler can interrupt the main thread while it holds the profiler lock,
+        so the toggle itself is left to profile_signal_worker.
+        """
+        self.profile_signaled.set()
+
+    def profile_signal_worker(self):
+        """Toggles profiling each time SIGUSR1 is received, see on_profile_signal."""
+        while True:
+            self.profile_signaled.wait()
+            self.profile_signaled.clear()
+            self.toggle_profiling()
+
+    def install_profile_signal(self):
+        """Toggles profiling on SIGUSR1, if the platform has it and the daemon runs on the main thread."""
+        if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+            Thread(target=self.profile_signal_worker, name='pywalfox-profile', daemon=True).start()
+            signal.signal(signal.SIGUSR1, self.on_profile_signal)
+            self.profile_signal_installed = True
+
+    def start_colors_watcher(self):
+        """Starts watching the Pywal colors file, unless disabled in the settings."""
+        if get_setting('watch_colors', True) is False:
+            logging.debug('Colors watcher is disabled')
+            return
+
+        force_polling = get_setting('watch_mode') == 'poll'
+        self.colors_watcher = ColorsWatcher(PYWAL_COLORS_PATH, self.on_colors_changed, force_polling)
+        self.colors_watcher.start()
+
     def start(self):
         """Starts the daemon and listens for incoming messages."""
         self.is_running = True
+        self.install_profile_signal()
+        self.messenger.start_writer()
         self.start_socket_server()
+        self.start_colors_watcher()
 
         while self.is_running:
             message = self.messenger.get_message()
-            logging.debug('Received message from extension: %s' % message)
+            logging.debug('Received message from extension: %s', message)
             self.handle_message(message)
 
     def close(self):
         """Application cleanup."""
         logging.debug('Running cleanup')
         self.is_running = False
+        if self.colors_watcher is not None:
+            self.colors_watcher.stop()
+
+        self.actions.shutdown(ACTION_SHUTDOWN_TIMEOUT)
+        if profiler.is_profiling():
+            self.toggle_profiling()
+
         self.socket_server.close()
+        self.messenger.close()
         sys.exit(0)
+
+
+register_action(ACTIONS['VERSION'], lambda daemon, message: daemon.send_version())
+register_action(ACTIONS['COLORS'], lambda daemon, message: daemon.send_colors_response(message))
+register_action(ACTIONS['CSS_ENABLE'], lambda daemon, message: daemon.send_enable_css_response(message), SERIAL)
+register_action(ACTIONS['CSS_DISABLE'], lambda daemon, message: daemon.send_disable_css_response(message), SERIAL)
+register_action(ACTIONS['CSS_FONT_SIZE'], lambda daemon, message: daemon.send_font_size_response(message), SERIAL, supersede=True)
+
+register_command(COMMANDS['UPDATE'], lambda daemon, command: daemon.update_pywal_colors(), merge='update')
+register_command(COMMANDS['THEME_MODE_DARK'], lambda daemon, command: daemon.set_theme_mode('dark'), merge='theme_mode')
+register_command(COMMANDS['THEME_MODE_LIGHT'], lambda daemon, command: daemon.set_theme_mode('light'), merge='theme_mode')
+register_command(COMMANDS['THEME_MODE_AUTO'], lambda daemon, command: daemon.set_theme_mode('auto'), merge='theme_mode')
+register_command(COMMANDS['SET_COLORS'], lambda daemon, command: daemon.send_pushed_palette(command))
+register_command(COMMANDS['STATS'], lambda daemon, command: {'result': daemon.get_stats()})
+register_command(COMMANDS['LOGS'], lambda daemon, command: {'result': {'pid': os.getpid(), 'records': get_recent_records()}})
+register_command(COMMANDS['PROFILE'], lambda daemon, command: daemon.toggle_profiling())
@@ -0,0 +1,160 @@
+import logging
+import threading
+from collections import deque
+
+from .profiler import profile_call
+
+
+class ActionExecutor:
+    """
+    Runs action handlers on a small thread pool, so that slow handlers do not
+    delay the messages that are handled on the thread that read them.
+
+    Handlers submitted with the same key run one at a time, in the order they
+    were submitted; handlers with different keys run in parallel. A queued handler
+    can be superseded by a newer one, which then takes its place at the end of the queue.
+    The thread pool is created when the first handler is submitted.
+
+    :param max_workers int: the number of threads in the pool
+    :param max_pending int: the number of handlers that can be queued or running
+    """
+    def __init__(self, max_workers, max_pending):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.pool = None
+        self.lock = threading.Condition()
+        self.pending = 0
+        self.superseded = 0
+        self.rejected = 0
+        # {key: deque of (supersede key, function, args)} of the keys that have a handler running
+        self.queues = {}
+
+    def get_pool(self):
+        """Gets the thread pool, creating it if needed."""
+        if self.pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='pywalfox-action')
+
+        return self.pool
+
+    def reserve(self):
+        """
+        Counts a new pending function, unless too many are pending. Must be called with the lock held.
+
+        :return: False if the function was rejected
+        :rType: bool
+        """
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            return False
+
+        self.pending += 1
+        return True
+
+    def submit(self, function, *args):
+        """
+        Runs a function on the thread pool.
+
+        :param function function: the function to call with args
+        :return: False if the function was rejected because too many functions are pending
+        :rType: bool
+        """
+        with self.lock:
+            if not self.reserve():
+                return False
+
+            pool = self.get_pool()
+
+        pool.submit(self.run, function, args)
+        return True
+
+    def submit_serial(self, key, function, *args, supersede=None):
+        """
+        Runs a function on the thread pool after the functions submitted earlier with the same key.
+
+        :param key str: functions with the same key run one at a time
+        :param function function: the function to call with args
+        :param supersede str: a queued function with the same key and supersede key is
+                              dropped, and this function is queued instead
+        :return: False if the function was rejected because too many functions are pending
+        :rType: bool
+        """
+        with self.lock:
+            queue = self.queues.get(key)
+            if queue is not None:
+                if supersede is not None:
+                    for entry in queue:
+                        if entry[0] == supersede:
+                            queue.remove(entry)
+                            self.pending -= 1
+                            self.superseded += 1
+                            break
+
+                if not self.reserve():
+                    return False
+
+                queue.append((supersede, function, args))
+                return True
+
+            if not self.reserve():
+                return False
+
+            self.queues[key] = deque()
+            pool = self.get_pool()
+
+        pool.submit(self.run_serial, key, function, args)
+        return True
+
+    def call(self, function, args):
+        """Calls a function, logging instead of raising its exceptions."""
+        try:
+            profile_call(function, args)
+        except Exception:
+            logging.error('Action handler failed', exc_info=True)
+
+    def finish(self):
+        """Marks a submitted function as done."""
+        with self.lock:
+            self.pending -= 1
+            if self.pending == 0:
+                self.lock.notify_all()
+
+    def run(self, function, args):
+        """Runs a function submitted with submit."""
+        self.call(function, args)
+        self.finish()
+
+    def run_serial(self, key, function, args):
+        """Runs a function submitted with submit_serial, then the ones queued after it."""
+        while True:
+            self.call(function, args)
+            self.finish()
+            with self.lock:
+                queue = self.queues[key]
+                if not queue:
+                    del self.queues[key]
+                    return
+
+                (_, function, args) = queue.popleft()
+
+    def wait(self, timeout=None):
+        """
+        Waits until all submitted functions have run.
+
+        :param timeout float: the maximum number of seconds to wait, or None to wait indefinitely
+        :return: False if functions were still pending after the timeout
+        :rType: bool
+        """
+        with self.lock:
+            return self.lock.wait_for(lambda: self.pending == 0, timeout)
+
+    def shutdown(self, timeout=None):
+        """
+        Waits for the submitted functions and stops the thread pool.
+
+        :param timeout float: the maximum number of seconds to wait for the functions
+        """
+        self.wait(timeout)
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
@@ -1,55 +1,136 @@
+import re
 import sys
 import json
 import logging
 from .config import PYWAL_COLORS_PATH
+from .utils.fs import get_file_signature
+
+HEX_COLOR_PATTERN = re.compile(r'^#[0-9a-fA-F]{6}$')
+
+# (stat signature of the colors file, result) of the last successful read in get_pywal_colors.
+# The fetcher is called from several threads, so the entry is only ever replaced as a whole.
+_cache = None
+
+_cache_stats = {
+    'hits': 0,
+    'misses': 0,
+}
 
 def create_error(err):
     error_message = 'Failed to read colors: {0}'.format(err)
     logging.error(error_message)
     return (False, None, error_message)
 
-def get_pywal_colors():
+def invalidate_cache():
+    """Drops the cached colorscheme, forcing the next call to get_pywal_colors to read the file."""
+    global _cache
+    _cache = None
+
+def get_cache_stats():
     """
-    Fetches the Pywal colors from the cache file.
+    Gets the number of cache hits and misses in get_pywal_colors.
 
-    :return: the colors generated by Pywal
-    :rType: list
+    :return: a copy of the cache counters
+    :rType: dict
+    """
+    return dict(_cache_stats)
+
+def parse_pywal_colors(pywal_data, source, require_wallpaper=True, check_format=False):
+    """
+    Validates a colorscheme in the format of the Pywal cache file.
+
+    :param pywal_data dict: the colorscheme, with 'colors' as a dict or a list of at least 16 colors
+    :param source str: where the colorscheme came from, used in error messages
+    :param require_wallpaper bool: if the colorscheme must contain a wallpaper path
+    :param check_format bool: if every color must be in the #rrggbb format
+    :return: (success, {'colors', 'wallpaper'}, error message)
+    :rType: tuple
+    """
+    if not isinstance(pywal_data, dict):
+        error_message = '%s is not a JSON object' % source
+        logging.error(error_message)
+        return (False, None, error_message)
+
+    if 'colors' in pywal_data:
+        colors = pywal_data['colors']
+        colors = list(colors.values()) if isinstance(colors, dict) else colors
+    else:
+        error_message = '%s does not contain any color values' % source
+        logging.error(error_message)
+        return (False, None, error_message)
+
+    if 'wallpaper' in pywal_data:
+        wallpaper = pywal_data['wallpaper']
+    elif require_wallpaper is False:
+        wallpaper = ''
+    else:
+        error_message = '%s does not contain a wallpaper path' % source
+        logging.error(error_message)
+        return (False, None, error_message)
+
+    if not isinstance(colors, list) or len(colors) < 16 or not isinstance(wallpaper, str):
+        error_message = '%s is invalid, it must contain at least 16 colors' % source
+        logging.error(error_message)
+        return (False, None, error_message)
+
+    if check_format is True:
+        invalid = [color for color in colors if not isinstance(color, str) or not HEX_COLOR_PATTERN.match(color)]
+        if invalid:
+            error_message = '%s contains invalid colors, expected #rrggbb: %s' % (source, str(invalid[0]))
+            logging.error(error_message)
+            return (False, None, error_message)
+
+    return (True, {'colors': colors, 'wallpaper': wallpaper}, None)
+
+def read_pywal_colors():
+    """
+    Reads and validates the Pywal colors from the cache file.
+
+    :return: (success, {'colors', 'wallpaper'}, error message)
+    :rType: tuple
     """
-    colors = []
-    wallpaper = ''
     try:
         with open(PYWAL_COLORS_PATH, 'r') as f:
             pywal_data = json.load(f)
-            if 'colors' in pywal_data:
-                for key in pywal_data['colors']:
-                    colors.append(pywal_data['colors'][key])
-            else:
-                error_message = '%s does not contain any color values' % PYWAL_COLORS_PATH
-                logging.error(error_message)
-                return (False, None, error_message)
-
-            if 'wallpaper' in pywal_data:
-                wallpaper = pywal_data['wallpaper']
-            else:
-                error_message = '%s does not contain a wallpaper path' % PYWAL_COLORS_PATH
-                logging.error(error_message)
-                return (False, None, error_message)
-
     except (IOError, ValueError):
         error_message = 'Could not read colors from: %s' % PYWAL_COLORS_PATH
         logging.error(error_message)
         return (False, None, error_message)
-    except json.JSONDecodeError as err:
-        return create_error(err)
-    except IOError as err:
-        return create_error(err)
     except:
         return create_error(sys.exc_info()[1])
 
-    if len(colors) < 16:
-        error_message = '%s containing the generated Pywal colors is invalid' % PYWAL_COLORS_PATH
-        logging.error(error_message)
-        return (False, None, error_message)
+    result = parse_pywal_colors(pywal_data, PYWAL_COLORS_PATH)
+    if result[0] is True:
+        logging.debug('Successfully fetched Pywal colors')
 
-    logging.debug('Successfully fetched Pywal colors')
-    return (True, {'colors': colors, 'wallpaper': wallpaper}, None)
+    return result
+
+def get_pywal_colors():
+    """
+    Fetches the Pywal colors from the cache file.
+
+    The parsed result is kept in memory and reused for as long as the
+    mtime, size and inode of the cache file stay the same. Only successful
+    reads are cached, so errors are re-checked on every call.
+    The returned data is shared between callers and must not be modified.
+
+    :return: (success, {'colors', 'wallpaper'}, error message)
+    :rType: tuple
+    """
+    global _cache
+
+    key = get_file_signature(PYWAL_COLORS_PATH)
+    cached = _cache
+    if key is not None and cached is not None and key == cached[0]:
+        _cache_stats['hits'] += 1
+        return cached[1]
+
+    _cache_stats['misses'] += 1
+    result = read_pywal_colors()
+
+    if result[0] is True and key is not None:
+        _cache = (key, result)
+    else:
+        invalidate_cache()
+
+    return result
@@ -2,6 +2,10 @@ import sys
 import json
 import struct
 
+from . import stats
+from .writer import Writer
+from .config import WRITER_QUEUE_SIZE, WRITER_FLUSH_TIMEOUT, COLLAPSIBLE_ACTIONS
+
 
 class Messenger:
     """
@@ -11,6 +15,9 @@ class Messenger:
     """
     def __init__(self, version):
         self.stdout, self.stdin = self.get_stdio_handle(version)
+        self.frame_cache = {}
+        self.read_buffer = bytearray()
+        self.writer = None
 
     def get_stdio_handle(self, python_version):
         """
@@ -35,8 +42,32 @@ class Messenger:
         """
         data_length = struct.unpack('@I', encoded_length)[0]
         message = self.stdin.read(data_length).decode('utf-8')
+        stats.increment('messenger.bytes_read', 4 + data_length)
         return json.loads(message)
 
+    def decode_frames(self, data):
+        """
+        Decodes all complete messages in a chunk of data read from stdin.
+        Incomplete messages are buffered until the rest of the data is received.
+
+        :param data bytes: the data read from stdin
+        :return: the decoded messages
+        :rType: list
+        """
+        stats.increment('messenger.bytes_read', len(data))
+        self.read_buffer += data
+        messages = []
+        while len(self.read_buffer) >= 4:
+            data_length = struct.unpack_from('@I', self.read_buffer)[0]
+            if len(self.read_buffer) < 4 + data_length:
+                break
+
+            message = bytes(self.read_buffer[4:4 + data_length]).decode('utf-8')
+            del self.read_buffer[:4 + data_length]
+            messages.append(json.loads(message))
+
+        return messages
+
     def encode_message(self, message):
         """
         Encodes a message to be sent to stdout.
@@ -49,6 +80,51 @@ class Messenger:
         buffer_length = struct.pack('@I', len(json_string))
         return (buffer_length, json_string)
 
+    def encode_frame(self, message):
+        """
+        Encodes a message into a single buffer containing both the length header and the data.
+
+        :param message object: the message to encode
+        :return: the framed message
+        :rType: bytes
+        """
+        length, encoded_message = self.encode_message(message)
+        return length + encoded_message
+
+    def get_frame(self, message_object, cache_key=None, cache_token=None):
+        """
+        Gets the encoded frame for a message, reusing a previously encoded frame if possible.
+
+        A cached frame is reused when it was stored under the same key and the token
+        is the same object as the one that was used when the frame was encoded.
+
+        :param message_object Message: the message to encode
+        :param cache_key str: the key to cache the frame under, or None to skip caching
+        :param cache_token any: identifies the data the frame was encoded from
+        :return: the framed message
+        :rType: bytes
+        """
+        if cache_key is None:
+            return self.encode_frame(message_object.getMessage())
+
+        cached = self.frame_cache.get(cache_key)
+        if cached is not None and cached[0] is cache_token:
+            return cached[1]
+
+        frame = self.encode_frame(message_object.getMessage())
+        self.frame_cache[cache_key] = (cache_token, frame)
+        return frame
+
+    def write_frame(self, frame):
+        """
+        Writes an encoded frame to stdout using a single write.
+
+        :param frame bytes: the framed message
+        """
+        self.stdout.write(frame)
+        self.stdout.flush()
+        stats.increment('messenger.bytes_written', len(frame))
+
     def get_message(self):
         """
         Reads message from extension in stdin.
@@ -62,13 +138,48 @@ class Messenger:
 
         return self.decode_message(encoded_length)
 
-    def send_message(self, message_object):
+    def start_writer(self):
+        """
+        Starts the outbound writer thread.
+        After this, messages from any thread are queued and written in order by a single writer.
+        """
+        self.writer = Writer(self.write_frame, WRITER_QUEUE_SIZE)
+        self.writer.start()
+
+    def send_message(self, message_object, cache_key=None, cache_token=None):
         """
         Sends a message to stdout.
 
+        The message is encoded on the calling thread. If the writer has been started
+        it is then queued, and a pending message with a collapsible action is replaced.
+
         :param message [Message|ErrorMessage]: the message to encode and send
+        :param cache_key str: see get_frame
+        :param cache_token any: see get_frame
+        :return: the key the message was queued under, see is_queued, or None if it was not queued
         """
-        length, encoded_message = self.encode_message(message_object.getMessage())
-        self.stdout.write(length)
-        self.stdout.write(encoded_message)
-        self.stdout.flush()
+        frame = self.get_frame(message_object, cache_key, cache_token)
+        if self.writer is None:
+            self.write_frame(frame)
+            return None
+
+        collapse_key = None
+        if message_object.action in COLLAPSIBLE_ACTIONS:
+            collapse_key = message_object.action
+
+        return self.writer.put(frame, collapse_key)
+
+    def is_queued(self, key):
+        """
+        Checks if a message is still waiting to be written.
+
+        :param key [int|str]: the key returned by send_message
+        :rType: bool
+        """
+        return key is not None and self.writer is not None and self.writer.is_queued(key)
+
+    def close(self):
+        """Writes any pending messages and stops the writer thread."""
+        if self.writer is not None:
+            self.writer.stop(WRITER_FLUSH_TIMEOUT)
+            self.writer = None
@@ -0,0 +1,133 @@
+import os
+import sys
+import time
+import logging
+import threading
+
+from .config import PROFILE_DIR, PROFILE_TRACEMALLOC_FRAMES
+
+# From Python 3.12 on, cProfile records every thread. Before that, it only records the
+# thread it was enabled on, so each thread is profiled per call instead, see profile_call.
+PROFILES_ALL_THREADS = sys.version_info >= (3, 12)
+
+_lock = threading.Lock()
+
+# {'profile', 'threads', 'started', 'stop_tracing'} while profiling, otherwise None.
+# 'profile' records every thread from Python 3.12 on and is None before that, when
+# 'threads' holds {thread ID: profile} of the threads recorded by profile_call.
+_session = None
+
+def is_profiling():
+    """Checks if a profile is being recorded."""
+    return _session is not None
+
+def start_profiling():
+    """
+    Starts recording a CPU profile with cProfile and the memory allocations with tracemalloc.
+    Before Python 3.12, only the functions run through profile_call are recorded,
+    e.g. the action and command handlers, since cProfile can not follow other threads.
+
+    :return: False if a profile is already being recorded
+    :rType: bool
+    """
+    global _session
+
+    import cProfile
+    import tracemalloc
+
+    with _lock:
+        if _session is not None:
+            return False
+
+        # Someone else, e.g. PYTHONTRACEMALLOC, may already be tracing allocations
+        stop_tracing = not tracemalloc.is_tracing()
+        if stop_tracing:
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+
+        profile = None
+        if PROFILES_ALL_THREADS:
+            profile = cProfile.Profile()
+            profile.enable()
+
+        _session = {'profile': profile, 'threads': {}, 'started': time.time(), 'stop_tracing': stop_tracing}
+
+    logging.debug('Started profiling')
+    return True
+
+def profile_call(function, args):
+    """
+    Calls a function, recording it in a profile of the calling thread before Python 3.12,
+    unless the thread is already being profiled. The profile is enabled and disabled on the
+    thread itself, so the toggle can be requested from any thread.
+
+    :param function function: the function to call
+    :param args tuple: the arguments to call the function with
+    :return: the return value of the function
+    """
+    session = _session
+    if session is None or PROFILES_ALL_THREADS or sys.getprofile() is not None:
+        return function(*args)
+
+    import cProfile
+
+    thread_id = threading.get_ident()
+    with _lock:
+        profile = session['threads'].get(thread_id)
+        if profile is None:
+            profile = cProfile.Profile()
+            session['threads'][thread_id] = profile
+
+    profile.enable()
+    try:
+        return function(*args)
+    finally:
+        profile.disable()
+
+def stop_profiling():
+    """
+    Stops recording and writes the profile to PROFILE_DIR, as a pstats file
+    (see `python -m pstats`) and a tracemalloc snapshot (see tracemalloc.Snapshot.load).
+    The profiles of the threads recorded by profile_call are merged into the pstats file,
+    which is left out if nothing was recorded.
+    The files are named after the process ID and the time the profile was started.
+
+    :return: the paths of the written files, or None if no profile was being recorded
+    :rType: list
+    """
+    global _session
+
+    import pstats
+    import tracemalloc
+
+    with _lock:
+        session = _session
+        if session is None:
+            return None
+
+        _session = None
+        profiles = list(session['threads'].values())
+        if session['profile'] is not None:
+            session['profile'].disable()
+            profiles.append(session['profile'])
+        snapshot = tracemalloc.take_snapshot()
+        if session['stop_tracing']:
+            tracemalloc.stop()
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    started = time.strftime('%Y%m%d-%H%M%S', time.localtime(session['started']))
+    prefix = os.path.join(PROFILE_DIR, '%d-%s' % (os.getpid(), started))
+    paths = []
+    for profile in profiles:
+        profile.create_stats()
+
+    # pstats can not load a profile that recorded nothing
+    profiles = [profile for profile in profiles if profile.stats]
+    if profiles:
+        paths.append(prefix + '.pstats')
+        pstats.Stats(*profiles).dump_stats(paths[-1])
+
+    paths.append(prefix + '.tracemalloc')
+    snapshot.dump(paths[-1])
+
+    logging.debug('Stopped profiling, wrote %s', ', '.join(paths))
+    return paths
@@ -0,0 +1,279 @@
+import os
+import sys
+import json
+import logging
+
+from .utils.fs import get_file_signature, atomic_write
+from .config import PROFILE_INDEX_PATH, FIREFOX_PROFILES_PATHS_LINUX, FIREFOX_PROFILES_PATHS_WIN, FIREFOX_PROFILES_PATHS_DARWIN
+
+PROFILE_INDEX_VERSION = 1
+
+_profile_path_override = None
+
+# The profile index loaded by the current process, see load_profile_index
+_index = None
+
+def set_profile_path_override(path):
+    """Sets a custom Firefox profile path, overriding OS-specific defaults."""
+    global _profile_path_override
+    _profile_path_override = os.path.expanduser(path)
+
+def get_profile_roots():
+    """
+    Gets the folders that may contain a profiles.ini, for Firefox and its forks.
+
+    :return: the profile root folders, in order of preference
+    :rType: list
+    """
+    if _profile_path_override is not None:
+        return [_profile_path_override]
+    if sys.platform.startswith('win32'):
+        return FIREFOX_PROFILES_PATHS_WIN
+    elif sys.platform.startswith('darwin'):
+        return FIREFOX_PROFILES_PATHS_DARWIN
+    else:
+        return FIREFOX_PROFILES_PATHS_LINUX
+
+def get_root_signature(root):
+    """
+    Gets the stat signatures of the ini files in a profile root.
+
+    :param root str: the profile root folder
+    :return: {ini filename: signature}
+    :rType: dict
+    """
+    signature = {}
+    for filename in ('profiles.ini', 'installs.ini'):
+        file_signature = get_file_signature(os.path.join(root, filename))
+        signature[filename] = list(file_signature) if file_signature is not None else None
+
+    return signature
+
+def read_ini(path):
+    """
+    Reads an ini file written by Firefox.
+
+    :param path str: the path to the ini file
+    :return: the parsed file, or None if it does not exist or is invalid
+    :rType: ConfigParser
+    """
+    import configparser
+
+    if not os.path.isfile(path):
+        return None
+
+    parser = configparser.ConfigParser(interpolation=None)
+    parser.optionxform = str # keys are case sensitive
+    try:
+        parser.read(path)
+    except configparser.Error as e:
+        logging.error('Could not parse %s: %s', path, str(e))
+        return None
+
+    return parser
+
+def resolve_profile_path(root, path, is_relative):
+    """
+    Gets the absolute path to a profile.
+
+    :param root str: the profile root folder
+    :param path str: the path from the ini file
+    :param is_relative bool: if the path is relative to the root
+    :return: the normalized, absolute path
+    :rType: str
+    """
+    if is_relative:
+        return os.path.normpath(os.path.join(root, path))
+
+    return os.path.normpath(path)
+
+def parse_profile_root(root):
+    """
+    Parses profiles.ini and installs.ini in a profile root.
+
+    :param root str: the profile root folder
+    :return: {'profiles': [{'name', 'path', 'is_default'}], 'install_defaults': [path]}
+    :rType: dict
+    """
+    profiles = []
+    install_defaults = []
+    profiles_ini = read_ini(os.path.join(root, 'profiles.ini'))
+    if profiles_ini is not None:
+        for section in profiles_ini.sections():
+            values = profiles_ini[section]
+            if section.startswith('Profile') and 'Path' in values:
+                profiles.append({
+                    'name': values.get('Name', section),
+                    'path': resolve_profile_path(root, values['Path'], values.get('IsRelative', '1') == '1'),
+                    'is_default': values.get('Default') == '1',
+                })
+            elif section.startswith('Install') and 'Default' in values:
+                install_defaults.append(resolve_profile_path(root, values['Default'], True))
+
+    installs_ini = read_ini(os.path.join(root, 'installs.ini'))
+    if installs_ini is not None:
+        for section in installs_ini.sections():
+            if 'Default' in installs_ini[section]:
+                path = resolve_profile_path(root, installs_ini[section]['Default'], True)
+                if path not in install_defaults:
+                    install_defaults.append(path)
+
+    return {
+        'profiles': profiles,
+        'install_defaults': install_defaults,
+    }
+
+def read_index_file():
+    """
+    Reads the profile index saved by a previous run.
+
+    :return: {root: {'signature', 'profiles', 'install_defaults'}}
+    :rType: dict
+    """
+    try:
+        with open(PROFILE_INDEX_PATH, 'r') as f:
+            data = json.load(f)
+        if data.get('version') == PROFILE_INDEX_VERSION:
+            return data['roots']
+    except (IOError, ValueError, KeyError, AttributeError):
+        pass
+
+    return {}
+
+def load_profile_index(roots=None):
+    """
+    Loads the index of all profiles in the given roots.
+
+    Roots whose ini files are unchanged since the index was saved are taken from
+    the saved index; only the others are parsed. The index is saved again if
+    anything was parsed.
+
+    :param roots list: the profile root folders, defaults to get_profile_roots()
+    :return: {root: {'signature', 'profiles', 'install_defaults'}} for each root with a profiles.ini
+    :rType: dict
+    """
+    global _index
+
+    if roots is None:
+        roots = get_profile_roots()
+
+    saved = read_index_file()
+    index = {}
+    changed = False
+    for root in roots:
+        signature = get_root_signature(root)
+        if signature['profiles.ini'] is None:
+            changed = changed or root in saved
+            continue
+
+        entry = saved.get(root)
+        if entry is None or entry.get('signature') != signature:
+            logging.debug('Indexing Firefox profiles in: %s', root)
+            entry = parse_profile_root(root)
+            entry['signature'] = signature
+            changed = True
+
+        index[root] = entry
+
+    if changed:
+        # Keep the roots that were not looked at, e.g. when a profile path override is used
+        merged = dict((root, entry) for root, entry in saved.items() if root not in roots)
+        merged.update(index)
+        save_index_file(merged)
+
+    _index = index
+    return index
+
+def save_index_file(index):
+    """
+    Saves the profile index.
+
+    :param index dict: see load_profile_index
+    """
+    try:
+        directory = os.path.dirname(PROFILE_INDEX_PATH)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        atomic_write(PROFILE_INDEX_PATH, json.dumps({'version': PROFILE_INDEX_VERSION, 'roots': index}))
+    except (IOError, OSError) as e:
+        logging.error('Could not save the profile index: %s', str(e))
+
+def get_profiles():
+    """
+    Gets all indexed profiles.
+
+    :return: a list of {'name', 'path', 'is_default', 'root'}
+    :rType: list
+    """
+    index = _index if _index is not None else load_profile_index()
+    profiles = []
+    for root, entry in index.items():
+        for profile in entry['profiles']:
+            profile = dict(profile)
+            profile['root'] = root
+            profiles.append(profile)
+
+    return profiles
+
+def get_lock_owner(profile_path):
+    """
+    Gets the process ID of the browser that has a profile open (Linux/macOS).
+    Firefox creates a 'lock' symlink pointing to '<ip>:+<pid>' while a profile is in use.
+
+    :param profile_path str: the path to the profile
+    :return: the process ID, or None if the profile is not in use
+    :rType: int
+    """
+    try:
+        target = os.readlink(os.path.join(profile_path, 'lock'))
+        pid = int(target.rsplit('+', 1)[1])
+        os.kill(pid, 0)
+        return pid
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def get_active_profile_path():
+    """
+    Gets the path to the profile that is most likely in use.
+
+    In order of preference: a profile locked by the process that started the daemon,
+    any locked profile, the default profile of a Firefox install (installs.ini),
+    the profile marked as default, and finally the first profile.
+
+    :return: the path to the profile, or False if no profile was found
+    :rType: str
+    """
+    index = load_profile_index()
+    candidates = []
+    for entry in index.values():
+        candidates.extend(entry['install_defaults'])
+    for entry in index.values():
+        candidates.extend(profile['path'] for profile in entry['profiles'] if profile['is_default'])
+    for entry in index.values():
+        candidates.extend(profile['path'] for profile in entry['profiles'])
+
+    # Remove duplicates while keeping the order of preference
+    seen = set()
+    candidates = [path for path in candidates if not (path in seen or seen.add(path))]
+
+    if not candidates:
+        logging.error('Could not find profiles.ini in Firefox profiles folder')
+        return False
+
+    if not sys.platform.startswith('win32'):
+        parent_pid = os.getppid()
+        lock_owners = [(path, get_lock_owner(path)) for path in candidates]
+        for (path, pid) in lock_owners:
+            if pid is not None and pid == parent_pid:
+                return path
+        for (path, pid) in lock_owners:
+            if pid is not None:
+                return path
+
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+
+    logging.error('The profile path retrieved from profiles.ini does not exist: %s', candidates[0])
+    return False
@@ -0,0 +1,86 @@
+from collections import namedtuple
+
+# Execution policies of message actions
+INLINE = 'inline' # run on the thread that read the message, for cheap replies
+POOL = 'pool' # run on the action thread pool
+SERIAL = 'serial' # run on the action thread pool, one at a time per message 'target'
+
+POLICIES = [INLINE, POOL, SERIAL]
+
+# handler is called with (daemon, message). With supersede, a queued serial message is dropped
+# when a newer message with the same action and target arrives. stats_name is the name of the
+# latency histogram of the action, built once so that handling a message does not format it.
+Action = namedtuple('Action', ['name', 'handler', 'policy', 'supersede', 'stats_name'])
+
+# handler is called with (daemon, command) and returns a reply fragment, see Daemon.handle_command.
+# Commands with the same merge key are merged when received together, see Daemon.coalesce_commands.
+Command = namedtuple('Command', ['name', 'handler', 'merge', 'stats_name'])
+
+# {action: Action} of the messages sent by the extension
+_actions = {}
+
+# {command: Command} of the commands sent through the socket server
+_commands = {}
+
+def register_action(name, handler, policy=INLINE, supersede=False, replace=False):
+    """
+    Registers the handler of a message action.
+
+    :param name str: the action, e.g. 'css:enable'
+    :param handler function: called with the daemon and the decoded message
+    :param policy str: where the handler runs, see POLICIES
+    :param supersede bool: with the serial policy, only the newest queued message per target is handled
+    :param replace bool: replace the handler if the action is already registered
+    """
+    if policy not in POLICIES:
+        raise ValueError('%s: invalid policy: %s' % (name, policy))
+    if supersede and policy != SERIAL:
+        raise ValueError('%s: only serial actions can be superseded' % name)
+    if name in _actions and not replace:
+        raise ValueError('%s: action is already registered' % name)
+
+    _actions[name] = Action(name, handler, policy, supersede, 'message %s' % name)
+
+def register_command(name, handler, merge=None, replace=False):
+    """
+    Registers the handler of a CLI command.
+
+    :param name str: the command, e.g. 'action:update'
+    :param handler function: called with the daemon and the decoded command, returns a reply fragment or None
+    :param merge str: commands with the same merge key are merged into the last one, None to never merge
+    :param replace bool: replace the handler if the command is already registered
+    """
+    if name in _commands and not replace:
+        raise ValueError('%s: command is already registered' % name)
+
+    _commands[name] = Command(name, handler, merge, 'command %s' % name)
+
+def get_action(name):
+    """
+    Gets a registered message action.
+
+    :param name str: the action
+    :return: the action, or None if it is not registered
+    :rType: Action
+    """
+    return _actions.get(name)
+
+def get_command(name):
+    """
+    Gets a registered CLI command.
+
+    :param name str: the command
+    :return: the command, or None if it is not registered
+    :rType: Command
+    """
+    return _commands.get(name)
+
+def get_command_name(command):
+    """
+    Gets the name of a CLI command.
+
+    :param command [str|dict]: a command name, or {'command', ...} for commands with arguments
+    :return: the name
+    :rType: str
+    """
+    return command['command'] if isinstance(command, dict) else command
@@ -9,12 +9,14 @@ class Message:
     :param data any: the additional data to send along with the message
     :param success bool: if the action was successfull
     :param error str: the error message if success is False
+    :param details list: per-item results, e.g. for each profile an action was applied to
     """
-    def __init__(self, action, data=None, success=True, message=None):
+    def __init__(self, action, data=None, success=True, message=None, details=None):
         self.action = action
         self.success = success
         self.data = data
         self.message = message
+        self.details = details
 
     def getMessage(self):
         """Creates the response message."""
@@ -32,5 +34,8 @@ class Message:
             else:
                 message['error'] = self.message
 
-        logging.debug('Created message: %s' % message)
+        if self.details is not None:
+            message['details'] = self.details
+
+        logging.debug('Created message: %s', message)
         return message
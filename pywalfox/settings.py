@@ -1,40 +1,154 @@
 import os
 import json
+import atexit
 import logging
+from threading import RLock, Timer
 
-from .config import PYWALFOX_CONFIG_DIR, PYWALFOX_CONFIG_PATH
+from .config import PYWALFOX_CONFIG_PATH, SETTINGS_FLUSH_DELAY
+from .utils.fs import get_file_signature, atomic_write
 
 
+class Settings:
+    """
+    Keeps the persisted settings in memory.
+
+    The file is only re-read when its mtime, size or inode changes, e.g. after
+    another process has saved it. Changes are written after a short delay so
+    that several updates result in a single write, and are merged with the
+    current contents of the file before being written through a temporary file.
+
+    :param path str: the path to the settings file
+    :param flush_delay float: the number of seconds to wait before writing changes
+    """
+    def __init__(self, path, flush_delay):
+        self.path = path
+        self.flush_delay = flush_delay
+        self.values = {}
+        self.pending = {}
+        self.signature = None
+        self.is_loaded = False
+        self.timer = None
+        self.lock = RLock()
+        atexit.register(self.flush)
+
+    def read(self):
+        """
+        Reads the settings file.
+
+        :return: the persisted settings
+        :rType: dict
+        """
+        if not os.path.isfile(self.path):
+            return {}
+
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (ValueError, IOError) as e:
+            logging.warning('Failed to load settings from %s: %s', self.path, e)
+            return {}
+
+    def reload_if_changed(self):
+        """Re-reads the settings file if it has changed since it was last read or written."""
+        signature = get_file_signature(self.path)
+        if self.is_loaded and signature == self.signature:
+            return
+
+        self.values = self.read()
+        self.values.update(self.pending)
+        self.signature = signature
+        self.is_loaded = True
+
+    def get(self, key, default=None):
+        """
+        Gets a single setting.
+
+        :param key str: the name of the setting
+        :param default any: returned if the setting is not present
+        :return: the value of the setting
+        """
+        with self.lock:
+            self.reload_if_changed()
+            return self.values.get(key, default)
+
+    def get_all(self):
+        """
+        Gets a copy of all settings.
+
+        :return: the current settings
+        :rType: dict
+        """
+        with self.lock:
+            self.reload_if_changed()
+            return dict(self.values)
+
+    def update(self, values):
+        """
+        Updates settings and schedules a write. Values that are already set are ignored.
+
+        :param values dict: the settings to update
+        :return: if any setting was changed
+        :rType: bool
+        """
+        with self.lock:
+            self.reload_if_changed()
+            changed = dict((key, value) for key, value in values.items() if key not in self.values or self.values[key] != value)
+            if not changed:
+                return False
+
+            self.values.update(changed)
+            self.pending.update(changed)
+
+            if self.timer is None:
+                self.timer = Timer(self.flush_delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+            return True
+
+    def flush(self):
+        """Writes pending changes to the settings file."""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+            if not self.pending:
+                return
+
+            # Merge with changes made by other processes since the file was read
+            self.reload_if_changed()
+
+            try:
+                directory = os.path.dirname(self.path)
+                if not os.path.exists(directory):
+                    os.makedirs(directory)
+
+                atomic_write(self.path, json.dumps(self.values, indent=2))
+                self.signature = get_file_signature(self.path)
+                self.pending = {}
+                logging.debug('Saved settings to %s', self.path)
+            except (IOError, OSError) as e:
+                logging.error('Failed to save settings to %s: %s', self.path, e)
+
+
+settings = Settings(PYWALFOX_CONFIG_PATH, SETTINGS_FLUSH_DELAY)
+
 def load_settings():
     """Loads persisted settings from the config file."""
-    if not os.path.isfile(PYWALFOX_CONFIG_PATH):
-        return {}
-
-    try:
-        with open(PYWALFOX_CONFIG_PATH, 'r') as f:
-            return json.load(f)
-    except (ValueError, IOError) as e:
-        logging.warning('Failed to load settings from %s: %s' % (PYWALFOX_CONFIG_PATH, e))
-        return {}
+    return settings.get_all()
 
 
-def save_settings(settings):
+def save_settings(values):
     """Persists settings to the config file, merging with any existing values."""
-    current = load_settings()
-    current.update(settings)
-
-    try:
-        if not os.path.exists(PYWALFOX_CONFIG_DIR):
-            os.makedirs(PYWALFOX_CONFIG_DIR)
+    settings.update(values)
 
-        with open(PYWALFOX_CONFIG_PATH, 'w') as f:
-            json.dump(current, f, indent=2)
 
-        logging.debug('Saved settings to %s' % PYWALFOX_CONFIG_PATH)
-    except (IOError, OSError) as e:
-        logging.error('Failed to save settings to %s: %s' % (PYWALFOX_CONFIG_PATH, e))
+def flush_settings():
+    """Writes any pending settings changes immediately."""
+    settings.flush()
 
 
 def get_setting(key, default=None):
     """Returns a single setting value, or *default* if not present."""
-    return load_settings().get(key, default)
+    return settings.get(key, default)
@@ -0,0 +1,155 @@
+import time
+import threading
+from time import perf_counter
+from bisect import bisect_left
+
+from .config import STATS_LATENCY_BUCKETS
+
+_enabled = True
+_lock = threading.Lock()
+_started = time.monotonic()
+
+# {name: count}
+_counters = {}
+
+# {name: [count, total, min, max, bucket counts]} of durations in microseconds
+_histograms = {}
+
+def set_enabled(enabled):
+    """
+    Turns the instrumentation on or off. When off, the functions in this module return immediately.
+
+    :param enabled bool: if statistics should be collected
+    """
+    global _enabled
+    _enabled = enabled
+
+def increment(name, value=1):
+    """
+    Adds to a counter.
+
+    :param name str: the name of the counter
+    :param value int: the amount to add
+    """
+    if not _enabled:
+        return
+
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+def start_timer():
+    """
+    Starts timing an operation, see stop_timer.
+
+    :return: the start time, or None if statistics are not collected
+    :rType: float
+    """
+    return perf_counter() if _enabled else None
+
+def stop_timer(name, start):
+    """
+    Records the duration of an operation in a histogram.
+
+    :param name str: the name of the histogram
+    :param start float: the value returned by start_timer
+    """
+    if start is None:
+        return
+
+    duration = (perf_counter() - start) * 1000000
+    bucket = bisect_left(STATS_LATENCY_BUCKETS, duration)
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = [0, 0.0, duration, duration, [0] * (len(STATS_LATENCY_BUCKETS) + 1)]
+            _histograms[name] = histogram
+
+        histogram[0] += 1
+        histogram[1] += duration
+        if duration < histogram[2]:
+            histogram[2] = duration
+        if duration > histogram[3]:
+            histogram[3] = duration
+        histogram[4][bucket] += 1
+
+def get_percentile(buckets, count, percentile):
+    """
+    Estimates a percentile from histogram buckets, as the upper bound of the bucket it falls in.
+
+    :param buckets list: the bucket counts
+    :param count int: the total count
+    :param percentile float: the percentile, from 0 to 100
+    :return: the upper bound in microseconds, or None if it falls in the last, unbounded bucket
+    :rType: float
+    """
+    target = count * percentile / 100
+    seen = 0
+    for (index, bucket_count) in enumerate(buckets):
+        seen += bucket_count
+        if seen >= target and index < len(STATS_LATENCY_BUCKETS):
+            return STATS_LATENCY_BUCKETS[index]
+
+    return None
+
+def get_snapshot():
+    """
+    Gets a copy of the collected statistics.
+
+    :return: {'enabled', 'uptime', 'counters', 'latency'}, with durations in microseconds
+    :rType: dict
+    """
+    with _lock:
+        counters = dict(_counters)
+        histograms = dict((name, list(histogram[:4]) + [list(histogram[4])]) for (name, histogram) in _histograms.items())
+
+    latency = {}
+    for (name, (count, total, minimum, maximum, buckets)) in histograms.items():
+        latency[name] = {
+            'count': count,
+            'mean': round(total / count, 1),
+            'min': round(minimum, 1),
+            'max': round(maximum, 1),
+            'p50': get_percentile(buckets, count, 50),
+            'p99': get_percentile(buckets, count, 99),
+            'buckets': dict(('<=%s' % bound, bucket_count) for (bound, bucket_count)
+                            in zip(STATS_LATENCY_BUCKETS + ['inf'], buckets) if bucket_count > 0),
+        }
+
+    return {
+        'enabled': _enabled,
+        'uptime': round(time.monotonic() - _started, 1),
+        'counters': counters,
+        'latency': latency,
+    }
+
+def format_snapshot(snapshot):
+    """
+    Formats a snapshot as text.
+
+    :param snapshot dict: see get_snapshot
+    :return: the formatted snapshot
+    :rType: str
+    """
+    lines = ['uptime: %.1f s%s' % (snapshot['uptime'], '' if snapshot['enabled'] else ' (statistics are disabled)')]
+
+    if snapshot['counters']:
+        lines.append('')
+        lines.append('%-40s %12s' % ('counter', 'value'))
+        for name in sorted(snapshot['counters']):
+            lines.append('%-40s %12s' % (name, snapshot['counters'][name]))
+
+    if snapshot['latency']:
+        lines.append('')
+        lines.append('%-40s %8s %10s %10s %10s %10s' % ('latency (us)', 'count', 'mean', 'p50', 'p99', 'max'))
+        for name in sorted(snapshot['latency']):
+            latency = snapshot['latency'][name]
+            lines.append('%-40s %8d %10.1f %10s %10s %10.1f' % (
+                name,
+                latency['count'],
+                latency['mean'],
+                '<=%s' % latency['p50'] if latency['p50'] is not None else '-',
+                '<=%s' % latency['p99'] if latency['p99'] is not None else '-',
+                latency['max'],
+            ))
+
+    return '\n'.join(lines)
@@ -0,0 +1,167 @@
+import colorsys
+import hashlib
+import logging
+
+from .config import THEME_DARK, THEME_LIGHT, THEME_TEXT_CANDIDATES
+
+# sRGB channel value (0-255) to linear light, used for the relative luminance
+LINEAR_CHANNEL = [c / 3294.6 if c <= 10 else ((c / 255 + 0.055) / 1.055) ** 2.4 for c in range(256)]
+
+# (palette hash, theme) of the last derived theme.
+# get_theme is called from several threads, so the entry is only ever replaced as a whole.
+_cache = None
+
+def get_palette_hash(colors):
+    """
+    Gets a hash that changes whenever a palette changes.
+
+    :param colors list: the Pywal colors
+    :return: the hash
+    :rType: str
+    """
+    return hashlib.sha1(','.join(colors).encode('utf-8')).hexdigest()
+
+def get_scheme_version(pywal_data):
+    """
+    Gets a version that changes whenever the colors or the wallpaper of a colorscheme change.
+
+    :param pywal_data dict: {'colors', 'wallpaper'}
+    :return: the version
+    :rType: str
+    """
+    return get_palette_hash(pywal_data['colors'] + [pywal_data['wallpaper']])[:16]
+
+def parse_palette(colors):
+    """
+    Parses hex colors into a flat array of RGB channels.
+
+    :param colors list: the Pywal colors, e.g. '#1a2b3c'
+    :return: 3 channel values (0-255) per color
+    :rType: bytes
+    """
+    palette = bytes.fromhex(''.join(color.lstrip('#') for color in colors))
+    if len(palette) != len(colors) * 3:
+        raise ValueError('expected colors in the #rrggbb format')
+
+    return palette
+
+def get_luminances(palette):
+    """
+    Gets the relative luminance (WCAG 2.0) of every color in a palette.
+
+    :param palette bytes: see parse_palette
+    :return: a luminance between 0 and 1 per color
+    :rType: list
+    """
+    linear = [LINEAR_CHANNEL[c] for c in palette]
+    return [0.2126 * r + 0.7152 * g + 0.0722 * b for (r, g, b) in zip(linear[0::3], linear[1::3], linear[2::3])]
+
+def get_contrast(luminance_a, luminance_b):
+    """
+    Gets the contrast ratio between two colors, from 1 to 21.
+
+    :param luminance_a float: the relative luminance of the first color
+    :param luminance_b float: the relative luminance of the second color
+    :return: the contrast ratio
+    :rType: float
+    """
+    (lighter, darker) = (max(luminance_a, luminance_b), min(luminance_a, luminance_b))
+    return (lighter + 0.05) / (darker + 0.05)
+
+def to_hex(rgb):
+    """Formats a (r, g, b) tuple of 0-255 channels as a hex color."""
+    return '#%02x%02x%02x' % tuple(rgb)
+
+def adjust_lightness(hls, lightness):
+    """
+    Changes the lightness of a color.
+
+    :param hls tuple: the color as (hue, lightness, saturation), all from 0 to 1
+    :param lightness float: the lightness to add, from -1 to 1
+    :return: the adjusted color as a hex string
+    :rType: str
+    """
+    (h, l, s) = hls
+    rgb = colorsys.hls_to_rgb(h, min(max(l + lightness, 0.0), 1.0), s)
+    return to_hex(round(c * 255) for c in rgb)
+
+def create_mapping(template, hex_colors, hls, luminances):
+    """
+    Creates a theme mapping, e.g. the dark theme, from a template.
+
+    :param template dict: {role: color index, or (color index, lightness to add)}
+    :param hex_colors list: the normalized hex colors
+    :param hls list: the colors as (hue, lightness, saturation)
+    :param luminances list: the relative luminance of the colors
+    :return: {role: hex color}, including the most readable 'text' color on 'background'
+    :rType: dict
+    """
+    mapping = {}
+    for (role, value) in template.items():
+        if isinstance(value, int):
+            mapping[role] = hex_colors[value]
+        else:
+            mapping[role] = adjust_lightness(hls[value[0]], value[1])
+
+    background = template['background']
+    background = background if isinstance(background, int) else background[0]
+    text = max(THEME_TEXT_CANDIDATES, key=lambda index: get_contrast(luminances[index], luminances[background]))
+    mapping['text'] = hex_colors[text]
+    mapping['text_contrast'] = round(get_contrast(luminances[text], luminances[background]), 2)
+
+    return mapping
+
+def derive_theme(colors):
+    """
+    Derives the numeric forms of a palette and the dark and light themes.
+
+    :param colors list: the 16 Pywal colors
+    :return: {'hash', 'rgb', 'hsl', 'luminance', 'contrast', 'dark', 'light'}
+    :rType: dict
+    """
+    palette = parse_palette(colors)
+    rgb = [palette[i:i + 3] for i in range(0, len(palette), 3)]
+    hls = [colorsys.rgb_to_hls(r / 255, g / 255, b / 255) for (r, g, b) in rgb]
+    luminances = get_luminances(palette)
+    hex_colors = [to_hex(color) for color in rgb]
+
+    return {
+        'hash': get_palette_hash(colors),
+        'rgb': [list(color) for color in rgb],
+        'hsl': [[round(h * 360), round(s * 100), round(l * 100)] for (h, l, s) in hls],
+        'luminance': [round(luminance, 4) for luminance in luminances],
+        # Contrast of every color against the darkest (0) and lightest (15) palette color
+        'contrast': {
+            'color0': [round(get_contrast(luminance, luminances[0]), 2) for luminance in luminances],
+            'color15': [round(get_contrast(luminance, luminances[15]), 2) for luminance in luminances],
+        },
+        'dark': create_mapping(THEME_DARK, hex_colors, hls, luminances),
+        'light': create_mapping(THEME_LIGHT, hex_colors, hls, luminances),
+    }
+
+def get_theme(colors):
+    """
+    Gets the derived theme of a palette, see derive_theme.
+
+    The theme is only derived again when the palette hash changes.
+    The returned theme is shared between callers and must not be modified.
+
+    :param colors list: the 16 Pywal colors
+    :return: the derived theme, or None if the palette could not be parsed
+    :rType: dict
+    """
+    global _cache
+
+    palette_hash = get_palette_hash(colors)
+    cached = _cache
+    if cached is not None and cached[0] == palette_hash:
+        return cached[1]
+
+    try:
+        theme = derive_theme(colors)
+    except (ValueError, IndexError) as e:
+        logging.error('Could not derive a theme from the colors: %s', str(e))
+        return None
+
+    _cache = (palette_hash, theme)
+    return theme
@@ -0,0 +1,50 @@
+import os
+
+
+def get_file_signature(path):
+    """
+    Gets a signature that changes whenever the file at the given path is modified or replaced.
+
+    :param path str: the path to the file
+    :return: (mtime in nanoseconds, size, inode) or None if the file could not be stat'ed
+    :rType: tuple
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+def atomic_write(path, data):
+    """
+    Writes data to a file by writing a temporary file in the same directory
+    and renaming it over the target, so readers never see a partially written file.
+
+    :param path str: the path to the file
+    :param data [str|bytes]: the new contents of the file
+    """
+    import tempfile
+
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.%s.' % os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+
+        if os.path.exists(path):
+            os.chmod(temp_path, os.stat(path).st_mode & 0o777)
+        else:
+            os.chmod(temp_path, 0o644)
+
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+        raise
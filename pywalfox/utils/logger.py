@@ -1,45 +1,163 @@
-import logging
 import os
-from logging.handlers import RotatingFileHandler
-from ..config import LOG_FILE_FORMAT, LOG_FILE_DATE_FORMAT, LOG_FILE_PATH, LOG_FILE_MAX_SIZE, LOG_FILE_COUNT
+import json
+import atexit
+import logging
+from collections import deque
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from queue import SimpleQueue
+from ..config import LOG_FILE_FORMAT, LOG_FILE_DATE_FORMAT, LOG_FILE_PATH, LOG_FILE_MAX_SIZE, LOG_FILE_COUNT, LOG_RING_SIZE
+
+# The listener thread that formats and writes the queued records, see setup_logging
+_listener = None
+
+# The handler that keeps the most recent records in memory, see get_recent_records
+_ring = None
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Puts log records on a queue without formatting them.
+
+    QueueHandler formats the message on the calling thread so that records can
+    be pickled. The queue is only read by a listener in the same process, so the
+    message and its arguments are kept as they are and formatted by the listener.
+    """
+    def prepare(self, record):
+        return record
+
 
+class RingHandler(logging.Handler):
+    """
+    Keeps the most recent log records in memory.
+
+    :param capacity int: the number of records to keep
+    """
+    def __init__(self, capacity):
+        logging.Handler.__init__(self)
+        self.records = deque(maxlen=capacity)
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def get_records(self):
+        """Gets a copy of the kept records, oldest first."""
+        self.acquire()
+        try:
+            return list(self.records)
+        finally:
+            self.release()
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats log records as single-line JSON objects."""
+    def format(self, record):
+        return json.dumps(get_record_fields(record, self))
+
+
+def get_record_fields(record, formatter):
+    """
+    Gets the fields of a log record that are written by JsonFormatter and get_recent_records.
 
-def create_rotating_log(name, log_level):
+    :param record LogRecord: the record
+    :param formatter Formatter: used to format the time and the exception
+    :return: {'time', 'level', 'logger', 'thread', 'message'}, and 'exception' if there is one
+    :rType: dict
     """
-    Creates a rotating log which will limit the size of the log file.
+    fields = {
+        'time': formatter.formatTime(record, LOG_FILE_DATE_FORMAT),
+        'level': record.levelname,
+        'logger': record.name,
+        'thread': record.threadName,
+        'message': record.getMessage(),
+    }
+    if record.exc_info:
+        fields['exception'] = formatter.formatException(record.exc_info)
+
+    return fields
+
+def create_formatter(log_format):
+    """
+    Creates the formatter of the log file.
+
+    :param log_format str: 'text', or 'json' for one JSON object per line
+    :return: the formatter
+    :rType: Formatter
+    """
+    if log_format == 'json':
+        return JsonFormatter()
+
+    return logging.Formatter(fmt=LOG_FILE_FORMAT, datefmt=LOG_FILE_DATE_FORMAT)
+
+def create_rotating_log(log_level):
+    """
+    Creates a rotating log handler which will limit the size of the log file.
 
-    :param name str: the name of the logger to add the rotating log handler to
     :param log_level int: the logging level to use, e.g logging.DEBUG
+    :return: the handler
+    :rType: RotatingFileHandler
     """
-    logger = logging.getLogger(name)
-    logger.setLevel(log_level)
-    formatter = logging.Formatter(fmt=LOG_FILE_FORMAT, datefmt=LOG_FILE_DATE_FORMAT)
     handler = RotatingFileHandler(LOG_FILE_PATH, maxBytes=LOG_FILE_MAX_SIZE, backupCount=LOG_FILE_COUNT)
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
+    handler.setLevel(log_level)
+    return handler
 
-def setup_logging(verbose, print_mode):
+def setup_logging(verbose, print_mode, log_format='text', ring=True, ring_debug=False):
     """
-    Creates a rotating log.
+    Sets up logging. Records are put on a queue by the logging calls and formatted and
+    written by a listener thread, so that log calls only cost a queue insertion.
 
     :param verbose bool: if debug messages should be saved/printed
-    :param print_mode bool: whether or not to print to the terminal
+    :param print_mode bool: whether or not to print to the terminal (stderr)
+    :param log_format str: 'text' or 'json', see create_formatter
+    :param ring bool: keep the most recent records in memory, at the level of the log
+    :param ring_debug bool: keep debug messages in memory even if not verbose. Every debug
+                            call then creates a record, which is slower and keeps its arguments alive
     """
+    global _listener, _ring
+
     os.makedirs(os.path.dirname(LOG_FILE_PATH), exist_ok=True)
     if verbose is True:
         if print_mode is True:
-            logging.basicConfig(
-                format=LOG_FILE_FORMAT,
-                datefmt=LOG_FILE_DATE_FORMAT,
-                level=logging.DEBUG
-            )
+            handler = logging.StreamHandler()
         else:
-            logging.basicConfig(
-                format=LOG_FILE_FORMAT,
-                datefmt=LOG_FILE_DATE_FORMAT,
-                filename=LOG_FILE_PATH,
-                level=logging.DEBUG,
-                filemode='w' # since we are debugging we want to overwrite the log each time
-            )
+            # since we are debugging we want to overwrite the log each time
+            handler = logging.FileHandler(LOG_FILE_PATH, mode='w')
+        handler.setLevel(logging.DEBUG)
     else:
-        create_rotating_log('', logging.ERROR) # use the root logger
+        handler = create_rotating_log(logging.ERROR)
+
+    handler.setFormatter(create_formatter(log_format))
+    handlers = [handler]
+    if ring is True:
+        _ring = RingHandler(LOG_RING_SIZE)
+        _ring.setLevel(logging.DEBUG if ring_debug else handler.level)
+        handlers.append(_ring)
+
+    log_queue = SimpleQueue()
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+    root = logging.getLogger() # use the root logger
+    root.addHandler(DeferredQueueHandler(log_queue))
+    root.setLevel(min(handler.level for handler in handlers))
+
+def stop_logging():
+    """Writes the queued records and stops the listener thread."""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def get_recent_records():
+    """
+    Gets the records kept in memory, see setup_logging.
+
+    :return: the records, oldest first, see get_record_fields
+    :rType: list
+    """
+    if _ring is None:
+        return []
+
+    formatter = logging.Formatter()
+    return [get_record_fields(record, formatter) for record in _ring.get_records()]
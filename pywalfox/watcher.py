@@ -0,0 +1,224 @@
+import os
+import sys
+import time
+import select
+import logging
+from threading import Thread, Event
+
+from .utils.fs import get_file_signature
+from .config import WATCHER_SETTLE_DELAY, WATCHER_SETTLE_MAX_WAIT, WATCHER_POLL_INTERVAL_MIN, WATCHER_POLL_INTERVAL_MAX, WATCHER_NETWORK_FILESYSTEMS
+
+# inotify flags, see inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+def get_filesystem_type(path):
+    """
+    Gets the type of the filesystem that the given path is mounted on (Linux only).
+
+    :param path str: the path to look up
+    :return: the filesystem type, e.g. 'ext4' or 'nfs4', or None if it could not be determined
+    :rType: str
+    """
+    path = os.path.realpath(path)
+    best_match = ''
+    fs_type = None
+    try:
+        with open('/proc/mounts', 'r') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+
+                mount_point = fields[1].replace('\\040', ' ')
+                if path == mount_point or path.startswith(mount_point.rstrip('/') + '/'):
+                    if len(mount_point) >= len(best_match):
+                        best_match = mount_point
+                        fs_type = fields[2]
+    except (IOError, OSError):
+        return None
+
+    return fs_type
+
+def create_inotify(path):
+    """
+    Creates a non-blocking inotify instance watching the given directory.
+
+    :param path str: the directory to watch
+    :return: the inotify file descriptor, or None if inotify is not available
+    :rType: int
+    """
+    if not sys.platform.startswith('linux') or not os.path.isdir(path):
+        return None
+
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    except (ImportError, OSError) as e:
+        logging.debug('inotify is not available: %s', str(e))
+        return None
+
+    fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+        logging.debug('inotify_init1 failed: %s', os.strerror(ctypes.get_errno()))
+        return None
+
+    mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    if libc.inotify_add_watch(fd, path.encode(sys.getfilesystemencoding()), mask) < 0:
+        logging.debug('inotify_add_watch failed: %s', os.strerror(ctypes.get_errno()))
+        os.close(fd)
+        return None
+
+    return fd
+
+
+class ColorsWatcher:
+    """
+    Watches the Pywal colors file and calls a function once a burst of writes has settled.
+
+    Uses inotify on the directory containing the file when available, and falls
+    back to polling the file with an increasing interval otherwise, e.g. on
+    network filesystems where inotify does not see remote changes.
+
+    :param path str: the path to the file to watch
+    :param callback function: called without arguments when the file has changed
+    :param force_polling bool: always use stat polling instead of inotify
+    """
+    def __init__(self, path, callback, force_polling=False):
+        self.path = path
+        self.callback = callback
+        self.force_polling = force_polling
+        self.signature = get_file_signature(path)
+        self.stop_event = Event()
+        self.thread = None
+        self.inotify_fd = None
+        self.wakeup_fds = None
+
+    def start(self):
+        """Starts the watcher thread."""
+        directory = os.path.dirname(self.path)
+        if not self.force_polling:
+            fs_type = get_filesystem_type(directory)
+            if fs_type in WATCHER_NETWORK_FILESYSTEMS:
+                logging.debug('%s is on a network filesystem (%s), using polling', directory, fs_type)
+            else:
+                self.inotify_fd = create_inotify(directory)
+
+        if self.inotify_fd is not None:
+            logging.debug('Watching %s using inotify', self.path)
+            self.wakeup_fds = os.pipe()
+            target = self.inotify_worker
+        else:
+            logging.debug('Watching %s using stat polling', self.path)
+            target = self.polling_worker
+
+        self.thread = Thread(target=target, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops the watcher thread."""
+        self.stop_event.set()
+        wakeup_fds = self.wakeup_fds
+        if wakeup_fds is not None:
+            try:
+                os.write(wakeup_fds[1], b'\0')
+            except OSError:
+                pass # the worker has already exited and closed the pipe
+
+        if self.thread is not None and self.thread.is_alive():
+            self.thread.join(WATCHER_POLL_INTERVAL_MIN)
+
+    def notify_if_changed(self):
+        """Calls the callback if the signature of the watched file has changed since the last call."""
+        signature = get_file_signature(self.path)
+        if signature is not None and signature != self.signature:
+            self.signature = signature
+            logging.debug('%s was changed', self.path)
+            try:
+                self.callback()
+            except Exception as e:
+                logging.error('Colors watcher callback failed: %s', str(e))
+
+    def drain_inotify(self):
+        """
+        Reads all pending inotify events.
+
+        :return: if any events were read
+        :rType: bool
+        """
+        read_events = False
+        while True:
+            try:
+                data = os.read(self.inotify_fd, 4096)
+            except BlockingIOError:
+                return read_events
+
+            if not data:
+                return read_events
+
+            read_events = True
+
+    def wait_for_inotify(self, timeout):
+        """
+        Waits for inotify events.
+
+        :param timeout float: the maximum number of seconds to wait
+        :return: if any events were read before the timeout
+        :rType: bool
+        """
+        readable, _, _ = select.select([self.inotify_fd, self.wakeup_fds[0]], [], [], timeout)
+        if self.inotify_fd in readable and not self.stop_event.is_set():
+            return self.drain_inotify()
+
+        return False
+
+    def inotify_worker(self):
+        """The watcher thread worker when using inotify."""
+        try:
+            while not self.stop_event.is_set():
+                if not self.wait_for_inotify(WATCHER_POLL_INTERVAL_MAX):
+                    continue
+
+                # Wait until no new events have arrived for the settle delay
+                deadline = time.monotonic() + WATCHER_SETTLE_MAX_WAIT
+                while time.monotonic() < deadline and not self.stop_event.is_set():
+                    if not self.wait_for_inotify(WATCHER_SETTLE_DELAY):
+                        break
+
+                if not self.stop_event.is_set():
+                    self.notify_if_changed()
+        finally:
+            os.close(self.inotify_fd)
+            os.close(self.wakeup_fds[0])
+            os.close(self.wakeup_fds[1])
+            self.inotify_fd = None
+            self.wakeup_fds = None
+
+    def polling_worker(self):
+        """The watcher thread worker when using stat polling."""
+        interval = WATCHER_POLL_INTERVAL_MIN
+        while not self.stop_event.wait(interval):
+            signature = get_file_signature(self.path)
+            if signature is None or signature == self.signature:
+                interval = min(interval * 2, WATCHER_POLL_INTERVAL_MAX)
+                continue
+
+            # Wait until the signature has stopped changing
+            deadline = time.monotonic() + WATCHER_SETTLE_MAX_WAIT
+            while time.monotonic() < deadline:
+                if self.stop_event.wait(WATCHER_SETTLE_DELAY):
+                    return
+
+                current = get_file_signature(self.path)
+                if current == signature:
+                    break
+
+                signature = current
+
+            self.notify_if_changed()
+            interval = WATCHER_POLL_INTERVAL_MIN
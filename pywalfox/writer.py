@@ -0,0 +1,103 @@
+import logging
+from itertools import count
+from collections import OrderedDict
+from threading import Thread, Condition
+
+
+class Writer:
+    """
+    Writes encoded frames from a bounded queue on a dedicated thread.
+
+    Producers never block. Frames queued with a collapse key replace any pending frame
+    with the same key, so only the latest one is written. When the queue is full, a new
+    frame with a collapse key is dropped. Frames without one, e.g. replies the extension
+    is waiting for, are always queued, even if that takes the queue past its limit.
+
+    :param write_frame function: writes a single frame to the output
+    :param max_size int: the maximum number of pending frames
+    """
+    def __init__(self, write_frame, max_size):
+        self.write_frame = write_frame
+        self.max_size = max_size
+        self.pending = OrderedDict()
+        self.condition = Condition()
+        self.sequence = count()
+        self.thread = None
+        self.is_running = False
+        self.collapsed = 0
+        self.dropped = 0
+
+    def start(self):
+        """Starts the writer thread."""
+        self.is_running = True
+        self.thread = Thread(target=self.worker, daemon=True)
+        self.thread.start()
+
+    def put(self, frame, collapse_key=None):
+        """
+        Queues a frame to be written.
+
+        :param frame bytes: the encoded frame
+        :param collapse_key str: pending frames with the same key are replaced by this frame
+        :return: the key the frame was queued under, see is_queued, or None if it was dropped
+        """
+        with self.condition:
+            if collapse_key is None:
+                key = next(self.sequence)
+            else:
+                key = collapse_key
+                if self.pending.pop(key, None) is not None:
+                    self.collapsed += 1
+
+            if len(self.pending) >= self.max_size:
+                if collapse_key is not None:
+                    self.dropped += 1
+                    logging.error('Outbound queue is full, dropped %s', collapse_key)
+                    return None
+
+                logging.error('Outbound queue is full, queueing the reply anyway')
+
+            self.pending[key] = frame
+            self.condition.notify_all()
+
+        return key
+
+    def is_queued(self, key):
+        """
+        Checks if a frame is still waiting to be written.
+
+        :param key [int|str]: the key returned by put
+        :rType: bool
+        """
+        with self.condition:
+            return key in self.pending
+
+    def worker(self):
+        """The writer thread worker."""
+        while True:
+            with self.condition:
+                while self.is_running and not self.pending:
+                    self.condition.wait()
+
+                if not self.pending:
+                    return
+
+                _, frame = self.pending.popitem(last=False)
+
+            try:
+                self.write_frame(frame)
+            except (IOError, OSError) as e:
+                logging.error('Failed to write message: %s', str(e))
+
+    def stop(self, timeout=None):
+        """
+        Writes the remaining frames and stops the writer thread.
+
+        :param timeout float: the maximum number of seconds to wait for pending frames
+        """
+        with self.condition:
+            self.is_running = False
+            self.condition.notify_all()
+
+        if self.thread is not None:
+            self.thread.join(timeout)
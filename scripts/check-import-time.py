@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Checks that the CLI and native messaging host entry points stay fast to import.
+
+Each entry point is run in a fresh interpreter with `-X importtime`. The CLI entry
+points run real commands, in a temporary home directory where no daemon is running.
+The check fails if a module that should be imported lazily is pulled in, or if the
+best cumulative import time out of a few runs exceeds the budget. Modules that are
+imported by the interpreter itself on startup are not counted.
+
+Usage: python scripts/check-import-time.py [--runs N] [--scale FACTOR]
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that the CLI commands only need for other actions
+CLI_FORBIDDEN = [
+    'asyncio',
+    'subprocess',
+    'pywalfox.daemon',
+    'pywalfox.fetcher',
+    'pywalfox.custom_css',
+    'pywalfox.messenger',
+    'pywalfox.channel.unix.server',
+    'pywalfox.utils.logger',
+]
+
+# Runs a CLI command the way the `pywalfox` console script does
+CLI_COMMAND = "import sys; from pywalfox.__main__ import main; sys.argv = ['pywalfox', '%s']; main()"
+
+# (name, interpreter arguments, budget in ms, modules that must not be imported).
+# argparse parses every CLI command, and 'dark' saves the theme mode with the settings module.
+ENTRY_POINTS = [
+    ('cli update', ['-c', CLI_COMMAND % 'update'], 45, CLI_FORBIDDEN + ['tempfile', 'pywalfox.settings']),
+    ('cli dark', ['-c', CLI_COMMAND % 'dark'], 50, CLI_FORBIDDEN),
+    ('native-host', ['-c', 'import pywalfox.__main__, pywalfox.daemon'], 80, [
+        'argparse',
+        'asyncio',
+        'subprocess',
+        'pywalfox.async_daemon',
+        'pywalfox.install',
+    ]),
+]
+
+def run_importtime(arguments, env):
+    """
+    Runs the interpreter with -X importtime and parses its output.
+
+    :param arguments list: the interpreter arguments, e.g. ['-c', 'pass']
+    :param env dict: the environment variables
+    :return: a list of (module name, cumulative import time in us) of the top-level imports,
+             and the set of all imported module names
+    :rType: tuple
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + arguments, stdin=subprocess.DEVNULL,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=env, universal_newlines=True)
+
+    imported = set()
+    top_level = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        _, times, name = line.split(':', 1)[1].split('|')
+        name = name.rstrip()
+        imported.add(name.strip())
+        if not name.startswith('  '):
+            top_level.append((name.strip(), int(times)))
+
+    if not imported:
+        raise RuntimeError('%s did not print any import times: %s' % (' '.join(arguments), result.stderr))
+
+    return (top_level, imported)
+
+def measure(arguments, env, startup):
+    """
+    Runs an entry point in a fresh interpreter and measures the imports it causes.
+
+    :param arguments list: the interpreter arguments
+    :param env dict: the environment variables
+    :param startup set: the modules that the interpreter imports on startup
+    :return: (cumulative import time in ms, set of imported module names)
+    :rType: tuple
+    """
+    (top_level, imported) = run_importtime(arguments, env)
+    cumulative = sum(elapsed for (name, elapsed) in top_level if name not in startup)
+    return (cumulative / 1000, imported - startup)
+
+def main():
+    parser = argparse.ArgumentParser(description='Checks the import time of the pywalfox entry points')
+    parser.add_argument('--runs', type=int, default=5, help='number of runs per entry point (default: %(default)s)')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplies all budgets, e.g. for slow CI machines')
+    args = parser.parse_args()
+
+    # Keep the CLI commands away from the user's settings and running daemons
+    home = tempfile.mkdtemp(prefix='pywalfox-importtime-')
+    env = dict(os.environ, PYTHONPATH=ROOT_PATH, PYTHONDONTWRITEBYTECODE='', HOME=home, APPDATA=home, TMPDIR=home,
+               XDG_CACHE_HOME=os.path.join(home, 'cache'), XDG_CONFIG_HOME=os.path.join(home, 'config'))
+
+    try:
+        (_, startup) = run_importtime(['-c', 'pass'], env)
+        failed = run_checks(args, env, startup)
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+    sys.exit(1 if failed else 0)
+
+def run_checks(args, env, startup):
+    """
+    Measures every entry point and prints the results.
+
+    :return: if an entry point failed its check
+    :rType: bool
+    """
+    failed = False
+    for (name, arguments, budget, forbidden) in ENTRY_POINTS:
+        timings = []
+        imported = set()
+        for _ in range(args.runs):
+            (elapsed, imported) = measure(arguments, env, startup)
+            timings.append(elapsed)
+
+        best = min(timings)
+        unexpected = sorted(set(forbidden) & imported)
+        scaled_budget = budget * args.scale
+        status = 'ok'
+        if best > scaled_budget or unexpected:
+            status = 'FAILED'
+            failed = True
+
+        print('%-12s %6.1f ms (budget %.0f ms) %s' % (name, best, scaled_budget, status))
+        for module in unexpected:
+            print('  imports %s, which should be imported lazily' % module)
+
+    return failed
+
+if __name__ == '__main__':
+    main()